@@ -1,29 +1,27 @@
 """
-Background tasks for the SCADA system.
+Background jobs for the SCADA system, run through services.scheduler.
 """
-import asyncio
 from services.alert import check_idle_devices
+from services.alert_lifecycle import alert_lifecycle
+from services.scheduler import scheduler
 from utils.logging import logger
 from utils import get_real_time
+from utils.config import IDLE_CHECK_INTERVAL, ALERT_RESOLVE_INTERVAL, ALERT_MIGRATE_INTERVAL
 from services.event_bus import event_bus
 
-async def check_idle_devices_task():
+def check_idle_devices_job():
     """
-    Background task to periodically check for idle devices and mark them as disconnected.
+    Mark idle devices as disconnected and publish their new status.
     """
-    while True:
-        try:
-            # Check for idle devices every minute
-            count, dis_devices = check_idle_devices()
-            if count > 0:
-                logger.info(f"Marked {count} devices as disconnected at {get_real_time().isoformat()}")
-            for device in dis_devices:
-                tenant_id, device_data = device
-                logger.debug(f"Publishing device status update for tenant {tenant_id}")
-                event_bus.publish_sync(f"device_status:{tenant_id}", device_data)
-            wait_time = 25
-            
-            await asyncio.sleep(wait_time)
-        except Exception as e:
-            logger.error(f"Error in idle device check task: {e}")
-            await asyncio.sleep(60)  # Wait a minute before trying again
+    # Only devices that went idle since the last check are read, so this can run often
+    count, dis_devices = check_idle_devices()
+    if count > 0:
+        logger.info(f"Marked {count} devices as disconnected at {get_real_time().isoformat()}")
+    # One pipelined round trip for the whole sweep
+    event_bus.publish_many_sync([(f"device_status:{tenant_id}", device_data) for tenant_id, device_data in dis_devices])
+
+def register_jobs() -> None:
+    """Register the periodic jobs with the scheduler"""
+    scheduler.add_job("idle_check", check_idle_devices_job, IDLE_CHECK_INTERVAL)
+    scheduler.add_job("alert_resolve", alert_lifecycle.flush, ALERT_RESOLVE_INTERVAL)
+    scheduler.add_job("alert_migrate", alert_lifecycle.migrate_legacy, ALERT_MIGRATE_INTERVAL)
@@ -0,0 +1,98 @@
+"""
+Microbenchmark: per-message CPU of status decoding, legacy path vs fast path.
+
+The legacy path is the pre-decoder code: regex topic match, stdlib json, pytz
+conversions, dict merges and two Pydantic models per message. The fast path is
+services.decoder: one validated parse from bytes into a SensorRecord.
+
+    cd app && python -m benchmarks.decode --rounds 20
+"""
+import argparse
+import json
+import re
+import time
+from datetime import datetime
+from pathlib import Path
+import pytz
+from models.report import SensorFull, SensorModel
+from services.decoder import build_record, decode_status, parse_topic
+
+CORPUS = Path(__file__).parent / "data" / "status_payloads.jsonl"
+
+local_tz = pytz.timezone('Asia/Ho_Chi_Minh')
+
+DEVICE_INFO = {
+    "_id": "67e0c7561e0ed75714dd1aea",
+    "name": "H08 - Bến Chùa 1",
+    "hour_on": 17,
+    "hour_off": 5,
+    "minute_on": 45,
+    "minute_off": 31,
+    "auto": True,
+    "toggle": True,
+    "tenant_id": "67e0c6e51e0ed75714dd1ae9",
+}
+
+def legacy_tz_datetime(timestamp: int) -> datetime:
+    utc_dt = datetime.fromtimestamp(timestamp, pytz.UTC)
+    time = utc_dt.replace(tzinfo=pytz.FixedOffset(420))
+    return time.astimezone(local_tz)
+
+def legacy_decode(topic: str, payload: bytes):
+    mac, _type = re.match(r"unit/(\w+)/(status|alive)", topic).groups()
+    data = json.loads(payload.decode("utf-8"))
+    data["timestamp"] = legacy_tz_datetime(data["time"])
+    data.pop("time")
+    data["mac"] = mac
+    data["energy_meter"] = data["total_energy"]
+    data["power_factor"] = 0.96
+    data["latitude"] = data.get("gps_lat", 0)
+    data["longitude"] = data.get("gps_log", 0)
+    if "gps_lat" in data: del data["gps_lat"]
+    if "gps_log" in data: del data["gps_log"]
+    device_data = {**DEVICE_INFO, **data}
+    device_data["device_id"] = str(device_data.get("_id"))
+    device_data["device_name"] = device_data.get("name")
+    return SensorModel(**device_data), SensorFull(**device_data)
+
+def fast_decode(topic: str, payload: bytes):
+    mac, _type = parse_topic(topic)
+    record = build_record(mac, decode_status(payload), DEVICE_INFO)
+    record.power_factor = 0.96
+    return record
+
+def load_corpus() -> list[tuple[str, bytes]]:
+    messages = []
+    with open(CORPUS) as f:
+        for line in f:
+            item = json.loads(line)
+            messages.append((item["topic"], json.dumps(item["payload"]).encode()))
+    return messages
+
+def measure(fn, messages, rounds: int) -> float:
+    """CPU microseconds per message"""
+    start = time.process_time()
+    for _ in range(rounds):
+        for topic, payload in messages:
+            fn(topic, payload)
+    return (time.process_time() - start) / (rounds * len(messages)) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Status decode microbenchmark")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    messages = load_corpus()
+    # Warm up both paths
+    measure(legacy_decode, messages, 1)
+    measure(fast_decode, messages, 1)
+
+    legacy = measure(legacy_decode, messages, args.rounds)
+    fast = measure(fast_decode, messages, args.rounds)
+    print(f"corpus: {len(messages)} messages x {args.rounds} rounds")
+    print(f"legacy: {legacy:8.2f} us/msg")
+    print(f"fast:   {fast:8.2f} us/msg")
+    print(f"speedup: {legacy / fast:.2f}x")
+
+if __name__ == "__main__":
+    main()
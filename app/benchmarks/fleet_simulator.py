@@ -0,0 +1,206 @@
+"""
+Device fleet simulator and ingest load generator.
+
+Simulates N devices publishing `unit/<mac>/status` payloads to a local mosquitto,
+with configurable interval, jitter, outages and flapping. Devices are pre-seeded in
+MongoDB and the device cache, so the ingest path treats them as registered devices.
+
+End-to-end latency is measured from publish to the `device_status:<tenant_id>` event
+for the same MAC arriving on Redis.
+
+    cd app && python -m benchmarks.fleet_simulator --tenant-id <id> --devices 5000 --duration 120
+"""
+import argparse
+import heapq
+import json
+import random
+import threading
+import time
+from paho.mqtt import client as mqtt_client
+from database.redis import get_redis_connection
+from utils.config import MQTT_BROKER, MQTT_PORT
+
+# Devices report their local (UTC+7) wall clock as an epoch value
+DEVICE_OFFSET = 7 * 3600
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+class SimulatedDevice:
+    def __init__(self, mac: str, flapping: bool):
+        self.mac = mac
+        self.toggle = random.random() < 0.5
+        self.energy = random.uniform(0, 1000)
+        self.flapping = flapping
+        self.silent_until = 0.0
+
+    def payload(self) -> str:
+        if random.random() < 0.02:
+            self.toggle = not self.toggle
+        power = random.randint(330, 340) if self.toggle else random.randint(0, 5)
+        self.energy += power / 1000 / 720
+        return json.dumps({
+            "time": int(time.time()) + DEVICE_OFFSET,
+            "voltage": round(random.uniform(225, 240), 1),
+            "current": round(random.uniform(1.2, 1.4) if self.toggle else random.uniform(0.1, 0.3), 2),
+            "power": power,
+            "total_energy": round(self.energy, 3),
+            "toggle": self.toggle,
+            "gps_lat": 10.77,
+            "gps_log": 106.69,
+        })
+
+def seed_devices(tenant_id: str, macs: list[str]) -> None:
+    """Register simulated devices in MongoDB and the device cache"""
+    from database.mongo import device_collection, create_tenant_db
+    from crud.device import create_device
+    from models.device import DeviceCreate
+
+    # Make sure the tenant's time-series collections exist
+    create_tenant_db(tenant_id)
+    existing = {d["mac"] for d in device_collection.find({"mac": {"$in": macs}}, {"mac": 1})}
+    for i, mac in enumerate(macs):
+        if mac in existing:
+            continue
+        create_device(DeviceCreate(
+            mac=mac,
+            name=f"SIM-{i:06d}",
+            hour_on=18,
+            hour_off=5,
+            minute_on=0,
+            minute_off=0,
+            auto=False,
+            tenant_id=tenant_id,
+        ))
+    print(f"Seeded {len(macs) - len(existing)} devices ({len(existing)} already present)")
+
+class LatencyCollector:
+    """Matches device_status events on Redis with the publish time of each MAC"""
+    def __init__(self, tenant_id: str):
+        self.tenant_id = tenant_id
+        self.sent: dict[str, float] = {}
+        self.latencies: list[float] = []
+        self.received = 0
+        self._lock = threading.Lock()
+        self._pubsub = get_redis_connection().pubsub(ignore_subscribe_messages=True)
+        self._thread = None
+
+    def mark_sent(self, mac: str) -> None:
+        with self._lock:
+            self.sent[mac] = time.perf_counter()
+
+    def _handle(self, message) -> None:
+        now = time.perf_counter()
+        try:
+            mac = json.loads(message["data"]).get("mac")
+        except Exception:
+            return
+        with self._lock:
+            self.received += 1
+            sent = self.sent.pop(mac, None)
+            if sent is not None:
+                self.latencies.append((now - sent) * 1000)
+
+    def start(self) -> None:
+        self._pubsub.subscribe(**{f"device_status:{self.tenant_id}": self._handle})
+        self._thread = self._pubsub.run_in_thread(sleep_time=0.01, daemon=True)
+
+    def stop(self) -> None:
+        if self._thread:
+            self._thread.stop()
+        self._pubsub.close()
+
+def run(args) -> None:
+    random.seed(args.random_seed)
+    macs = [f"{args.mac_prefix}{i:06x}" for i in range(args.devices)]
+    if not args.no_seed:
+        seed_devices(args.tenant_id, macs)
+
+    devices = [SimulatedDevice(mac, random.random() < args.flap_ratio) for mac in macs]
+    publishers = []
+    for i in range(args.connections):
+        publisher = mqtt_client.Client(mqtt_client.CallbackAPIVersion.VERSION2, client_id=f"fleet-sim-{i}-{random.randint(100, 999)}")
+        publisher.max_queued_messages_set(0)
+        publisher.connect(args.host, args.port, 60)
+        publisher.loop_start()
+        publishers.append(publisher)
+
+    collector = LatencyCollector(args.tenant_id)
+    collector.start()
+
+    start = time.monotonic()
+    # Spread the first message of every device over one interval
+    schedule = [(start + random.uniform(0, args.interval), i) for i in range(len(devices))]
+    heapq.heapify(schedule)
+    published = 0
+    next_report = start + 10
+    while schedule:
+        due, i = heapq.heappop(schedule)
+        now = time.monotonic()
+        if now - start > args.duration:
+            break
+        if due > now:
+            time.sleep(due - now)
+            now = due
+        device = devices[i]
+
+        if now >= device.silent_until:
+            if random.random() < args.disconnect_ratio * args.interval / max(args.duration, 1):
+                # Drop off the network for a while
+                device.silent_until = now + args.outage
+            elif device.flapping and random.random() < 0.5:
+                device.silent_until = now + args.flap_period
+            else:
+                publishers[i % len(publishers)].publish(f"unit/{device.mac}/status", device.payload())
+                collector.mark_sent(device.mac)
+                published += 1
+
+        interval = args.interval + random.uniform(-args.jitter, args.jitter)
+        heapq.heappush(schedule, (due + max(0.1, interval), i))
+
+        if now >= next_report:
+            elapsed = now - start
+            print(f"[{elapsed:6.0f}s] published {published} ({published / elapsed:.0f}/s), events {collector.received}")
+            next_report = now + 10
+
+    # Give the pipeline time to drain
+    time.sleep(args.drain)
+    elapsed = time.monotonic() - start
+    collector.stop()
+    for publisher in publishers:
+        publisher.loop_stop()
+        publisher.disconnect()
+
+    latencies = collector.latencies
+    print(f"devices:    {args.devices}")
+    print(f"published:  {published} ({published / elapsed:.0f} msg/s)")
+    print(f"events:     {collector.received} ({collector.received / elapsed:.0f} msg/s)")
+    print(f"latency ms: p50 {percentile(latencies, 50):.1f}  p90 {percentile(latencies, 90):.1f}  "
+          f"p99 {percentile(latencies, 99):.1f}  max {max(latencies, default=0):.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate a device fleet publishing status messages")
+    parser.add_argument("--tenant-id", required=True, help="Tenant that owns the simulated devices")
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--interval", type=float, default=5.0, help="Seconds between messages of a device")
+    parser.add_argument("--jitter", type=float, default=1.0, help="Max +/- seconds added to every interval")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds to publish")
+    parser.add_argument("--disconnect-ratio", type=float, default=0.0, help="Fraction of devices that go offline once during the run")
+    parser.add_argument("--outage", type=float, default=60.0, help="Seconds an offline device stays silent")
+    parser.add_argument("--flap-ratio", type=float, default=0.0, help="Fraction of devices that keep dropping on and off")
+    parser.add_argument("--flap-period", type=float, default=20.0, help="Seconds a flapping device stays silent")
+    parser.add_argument("--connections", type=int, default=4, help="MQTT connections used to publish")
+    parser.add_argument("--drain", type=float, default=5.0, help="Seconds to wait for events after publishing stops")
+    parser.add_argument("--mac-prefix", default="5100aa", help="First 6 hex digits of simulated MACs")
+    parser.add_argument("--host", default=MQTT_BROKER)
+    parser.add_argument("--port", type=int, default=MQTT_PORT)
+    parser.add_argument("--random-seed", type=int, default=1)
+    parser.add_argument("--no-seed", action="store_true", help="Do not register devices in MongoDB")
+    run(parser.parse_args())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Microbenchmark: schedule status of a fleet, one Python call per device vs one
+vectorized pass over services.fleet_table.
+
+The legacy path is the pre-table status code: two timezone-aware datetimes per call
+to check the working hours. Its results differ for devices within 7 minutes of an
+on/off time, see legacy_in_working_hours. Runs without MongoDB/Redis.
+
+    cd app && python -m benchmarks.fleet_table --devices 100000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+import pytz
+from models.alert import AlertSeverity, DeviceState
+from models.report import SensorRecord
+from services.fleet_table import FleetTable, STATES, SEVERITIES
+from utils import local_seconds
+from utils.config import POWER_MIN_THRESHOLD
+
+local_tz = pytz.timezone('Asia/Ho_Chi_Minh')
+
+def legacy_in_working_hours(current_time: datetime, hour_on: int, minute_on: int, hour_off: int, minute_off: int) -> bool:
+    # tzinfo=local_tz gives the zone's LMT offset (+07:07), so on/off were 7 minutes early
+    time_on = datetime(current_time.year, current_time.month, current_time.day, hour_on, minute_on, tzinfo=local_tz)
+    time_off = datetime(current_time.year, current_time.month, current_time.day, hour_off, minute_off, tzinfo=local_tz)
+    if hour_off < hour_on or (hour_off == hour_on and minute_off < minute_on):
+        if current_time.hour < hour_off or (current_time.hour == hour_off and current_time.minute < minute_off):
+            time_on = time_on - timedelta(days=1)
+        else:
+            time_off = time_off + timedelta(days=1)
+    return time_on <= current_time <= time_off
+
+def legacy_status(record: SensorRecord) -> tuple[DeviceState, AlertSeverity]:
+    current_time = datetime.now(pytz.UTC).astimezone(local_tz)
+    working = record.power >= POWER_MIN_THRESHOLD
+    in_hours = legacy_in_working_hours(current_time, record.hour_on, record.minute_on, record.hour_off, record.minute_off)
+    if record.voltage > 0:
+        if working and record.toggle:
+            if not record.auto or in_hours:
+                return DeviceState.WORKING, AlertSeverity.NORMAL
+            return DeviceState.ON_OUT_OF_HOUR, AlertSeverity.WARNING
+        elif not working and not record.toggle:
+            if not record.auto or not in_hours:
+                return DeviceState.OFF, AlertSeverity.NORMAL
+            return DeviceState.OFF_OUT_OF_HOUR, AlertSeverity.WARNING
+        elif working and not record.toggle:
+            return DeviceState.WORKING, AlertSeverity.CRITICAL
+    else:
+        return DeviceState.POWER_LOST, AlertSeverity.CRITICAL
+    return DeviceState.WORKING, AlertSeverity.NORMAL
+
+def make_records(count: int) -> list[SensorRecord]:
+    now = datetime.now(pytz.UTC)
+    return [
+        SensorRecord(
+            mac=f"mac{i}", device_id=f"dev{i}", device_name="bench", tenant_id="bench",
+            timestamp=now - timedelta(seconds=random.uniform(0, 60)),
+            voltage=random.choice([0.0, 230.0, 231.0, 232.0]), current=1.0,
+            power=random.choice([0.0, 5.0, 335.0]), power_factor=0.96, total_energy=0.0, energy_meter=0.0,
+            toggle=random.random() < 0.5, auto=random.random() < 0.7,
+            hour_on=random.randrange(24), hour_off=random.randrange(24),
+            minute_on=random.randrange(60), minute_off=random.randrange(60),
+            latitude=0.0, longitude=0.0,
+        )
+        for i in range(count)
+    ]
+
+def timed(fn) -> tuple[float, object]:
+    """Milliseconds and result"""
+    start = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - start) * 1000, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Fleet status evaluation microbenchmark")
+    parser.add_argument("--devices", type=int, default=100000)
+    parser.add_argument("--batch", type=int, default=200, help="gateway batch size")
+    args = parser.parse_args()
+
+    random.seed(0)
+    records = make_records(args.devices)
+    table = FleetTable()
+
+    upsert_ms, _ = timed(lambda: table.upsert(records))
+    legacy_ms, legacy = timed(lambda: [legacy_status(record) for record in records])
+    now_s = local_seconds()
+    evaluate_ms, (states, severities) = timed(lambda: table.evaluate(now_s=now_s))
+    cutoff = time.time() - 30
+    idle_ms, idle = timed(lambda: table.idle(cutoff))
+    batch = records[:args.batch]
+    batch_ms, _ = timed(lambda: table.evaluate_records(batch))
+
+    vectorized = list(zip((STATES[s] for s in states.tolist()), (SEVERITIES[s] for s in severities.tolist())))
+    mismatches = sum(1 for a, b in zip(legacy, vectorized) if a != b)
+    print(f"{args.devices} devices, {table.nbytes() / len(table):.0f} bytes/device in columns")
+    print(f"upsert all:          {upsert_ms:9.2f} ms")
+    print(f"legacy status loop:  {legacy_ms:9.2f} ms")
+    print(f"vectorized status:   {evaluate_ms:9.2f} ms  ({legacy_ms / evaluate_ms:.0f}x, {mismatches} differ from legacy)")
+    print(f"idle sweep:          {idle_ms:9.2f} ms  ({len(idle)} idle)")
+    print(f"batch of {args.batch}:        {batch_ms:9.2f} ms  (upsert + status)")
+
+if __name__ == "__main__":
+    main()
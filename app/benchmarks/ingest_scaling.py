@@ -0,0 +1,91 @@
+"""
+Benchmark: ingest throughput (messages/sec) versus number of worker processes.
+
+Publishes synthetic `unit/<mac>/status` messages to a local mosquitto and routes them
+through the ingest_worker dispatcher to N worker processes. Workers run the CPU part
+of the ingest path (status decode and record construction) without MongoDB/Redis, so the
+numbers show how the routing and per-message work scale with cores.
+
+    cd app && python -m benchmarks.ingest_scaling --workers 1 2 4 8 --messages 50000
+"""
+import argparse
+import json
+import multiprocessing
+import random
+import time
+from paho.mqtt import client as mqtt_client
+from ingest_worker import Dispatcher, start_workers, stop_workers
+
+def bench_worker(index: int, q, acks, processed) -> None:
+    from services.decoder import build_record, decode_status, parse_topic
+    device = {"_id": "bench", "name": "bench", "tenant_id": "bench"}
+    while True:
+        item = q.get()
+        if item is None:
+            break
+        topic, payload, _ = item
+        mac, _type = parse_topic(topic)
+        build_record(mac, decode_status(payload), device)
+        with processed.get_lock():
+            processed.value += 1
+
+def make_payload(i: int) -> str:
+    return json.dumps({
+        "time": int(time.time()) + i,
+        "voltage": round(random.uniform(220, 240), 1),
+        "current": round(random.uniform(0.1, 1.4), 1),
+        "power": random.randint(0, 340),
+        "total_energy": round(random.uniform(0, 1000), 2),
+        "toggle": random.choice([True, False]),
+        "gps_lat": 10.77,
+        "gps_log": 106.69,
+    })
+
+def run(workers: int, messages: int, devices: int, host: str, port: int, timeout: float) -> tuple[int, float]:
+    processed = multiprocessing.get_context("spawn").Value("i", 0)
+    queues, _, processes = start_workers(workers, target=bench_worker, args=(processed,))
+
+    dispatcher = Dispatcher(queues)
+    dispatcher.connect(host, port, 60)
+    dispatcher.loop_start()
+    time.sleep(1) # Let the subscription settle
+
+    macs = [f"bench{i:07d}" for i in range(devices)]
+    payloads = [make_payload(i) for i in range(min(messages, 1000))]
+    publisher = mqtt_client.Client(mqtt_client.CallbackAPIVersion.VERSION2, client_id=f"bench-pub-{random.randint(100, 999)}")
+    publisher.max_queued_messages_set(0)
+    publisher.connect(host, port, 60)
+    publisher.loop_start()
+
+    start = time.perf_counter()
+    for i in range(messages):
+        publisher.publish(f"unit/{macs[i % devices]}/status", payloads[i % len(payloads)])
+    deadline = start + timeout
+    while processed.value < messages and time.perf_counter() < deadline:
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - start
+
+    publisher.loop_stop()
+    publisher.disconnect()
+    dispatcher.loop_stop()
+    dispatcher.disconnect()
+    stop_workers(queues, processes)
+    return processed.value, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest throughput vs worker count")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--messages", type=int, default=50000)
+    parser.add_argument("--devices", type=int, default=2000)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    print(f"{'workers':>8} {'processed':>10} {'seconds':>8} {'msg/s':>10}")
+    for workers in args.workers:
+        processed, elapsed = run(workers, args.messages, args.devices, args.host, args.port, args.timeout)
+        print(f"{workers:>8} {processed:>10} {elapsed:>8.2f} {processed / elapsed:>10.0f}")
+
+if __name__ == "__main__":
+    main()
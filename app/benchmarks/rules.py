@@ -0,0 +1,95 @@
+"""
+Microbenchmark: per-message CPU of alert rule evaluation versus number of rules.
+
+Compiles random threshold rules over every metric and operator (a share of them with a
+duration) with services.rule_compiler and evaluates random status records against
+them, next to a naive loop that checks every rule. Runs without MongoDB/Redis.
+
+    cd app && python -m benchmarks.rules --rules 10 100 1000 10000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from models.alert import AlertSeverity, DeviceState
+from models.alert_rule import AlertRule, RuleMetric, RuleOperator
+from models.report import SensorRecord
+from services.rule_compiler import SEVERITY_RANK, CompiledRules
+
+RANGES = {
+    RuleMetric.VOLTAGE: (0, 260),
+    RuleMetric.CURRENT: (0, 10),
+    RuleMetric.POWER: (0, 2000),
+    RuleMetric.POWER_FACTOR: (0, 1),
+    RuleMetric.TOTAL_ENERGY: (0, 10000),
+}
+
+def make_rules(count: int, timed_share: float) -> list[AlertRule]:
+    rules = []
+    for i in range(count):
+        metric = random.choice(list(RuleMetric))
+        low, high = RANGES[metric]
+        rules.append(AlertRule(
+            _id=str(i),
+            name=f"rule-{i}",
+            metric=metric,
+            operator=random.choice(list(RuleOperator)),
+            threshold=random.uniform(low, high),
+            duration=random.choice([30, 60, 300]) if random.random() < timed_share else 0,
+            state=random.choice([DeviceState.VOLTAGE_LOW, DeviceState.CURRENT_HIGH, DeviceState.POWER_HIGH]),
+            severity=random.choice([AlertSeverity.WARNING, AlertSeverity.CRITICAL]),
+        ))
+    return rules
+
+def make_records(count: int, devices: int) -> list[SensorRecord]:
+    start = datetime(2025, 1, 1)
+    records = []
+    for i in range(count):
+        values = {metric.value: random.uniform(*RANGES[metric]) for metric in RuleMetric}
+        records.append(SensorRecord(
+            mac=f"mac{i % devices}", device_id=f"dev{i % devices}", device_name="bench", tenant_id="bench",
+            timestamp=start + timedelta(seconds=i // devices * 10), energy_meter=0.0, toggle=True, auto=False,
+            hour_on=18, hour_off=5, minute_on=0, minute_off=0, latitude=0.0, longitude=0.0, **values,
+        ))
+    return records
+
+def naive_evaluate(rules: list[AlertRule], record: SensorRecord):
+    """Instant rules only, every rule checked"""
+    best = None
+    for rule in rules:
+        value = getattr(record, rule.metric.value)
+        hit = value > rule.threshold if rule.operator == RuleOperator.ABOVE else value < rule.threshold
+        if hit and rule.duration == 0 and (best is None or SEVERITY_RANK[rule.severity] > SEVERITY_RANK[best.severity]):
+            best = rule
+    return best
+
+def measure(fn, records) -> float:
+    """CPU microseconds per record"""
+    start = time.process_time()
+    for record in records:
+        fn(record)
+    return (time.process_time() - start) / len(records) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Alert rule evaluation microbenchmark")
+    parser.add_argument("--rules", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--timed-share", type=float, default=0.3, help="share of rules with a duration")
+    args = parser.parse_args()
+
+    random.seed(0)
+    records = make_records(args.records, args.devices)
+    print(f"{args.records} records over {args.devices} devices")
+    print(f"{'rules':>8} {'compile ms':>11} {'compiled us/msg':>16} {'naive us/msg':>13}")
+    for count in args.rules:
+        rules = make_rules(count, args.timed_share)
+        start = time.perf_counter()
+        compiled = CompiledRules(rules)
+        compile_ms = (time.perf_counter() - start) * 1000
+        compiled_us = measure(compiled.evaluate, records)
+        naive_us = measure(lambda record: naive_evaluate(rules, record), records[:max(100, args.records * 10 // count)])
+        print(f"{count:>8} {compile_ms:>11.2f} {compiled_us:>16.2f} {naive_us:>13.2f}")
+
+if __name__ == "__main__":
+    main()
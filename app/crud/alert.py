@@ -1,8 +1,10 @@
 import traceback
 from database.mongo import get_alerts_collection
 from models.alert import AlertModel, AlertModelFull, AlertSeverity, DeviceState
+from services.alert_lifecycle import alert_lifecycle
 from utils.logging import logger
 from utils import fix_offset
+from utils.pagination import Position, cached_count, find_page
 
 def read_alerts(
     tenant_id: str,
@@ -12,14 +14,20 @@ def read_alerts(
     start: str = None,
     end: str = None,
     resolved: bool = None,
-    skip: int = 0,
-    limit: int = 100
-) -> tuple[int, list[AlertModel]]:
+    after: Position = None,
+    limit: int = 100,
+    count: bool = False
+) -> tuple[int | None, list[AlertModel], str | None]:
+    """
+    Alerts newest first, after the position of a cursor. Returns the total (when `count`,
+    cached, see utils.pagination), the page and the cursor of the next page.
+    """
     try:
         query = {}
         
+        # Device and resolution live in the metadata, see AlertModel.to_document
         if device:
-            query["device"] = device
+            query["metadata.device_id"] = device
         if state:
             query["state"] = state
         if severity:
@@ -36,32 +44,32 @@ def read_alerts(
         # Handle resolved status filtering
         if resolved is not None:
             if resolved:
-                query["resolved_time"] = {"$ne": None}
+                query["metadata.resolved_time"] = {"$ne": None}
             else:
-                query["resolved_time"] = None
+                query["metadata.resolved_time"] = None
         
         # Get the alerts collection
         alerts_collection = get_alerts_collection(tenant_id)
         
-        # Get total count for pagination metadata
-        total_count = alerts_collection.count_documents(query)
+        total_count = cached_count(alerts_collection, query) if count else None
         
-        # Get paginated results sorted by timestamp descending (latest first)
-        results = alerts_collection.find(query).sort("timestamp", -1).skip(skip).limit(limit)
+        # Resume after the last alert of the previous page (latest first)
+        results, next_cursor = find_page(alerts_collection, query, after, limit)
         
-        if results is None:
-            return 0, []
+        # Convert to models and fix timezone offset
+        alerts = [AlertModel.from_document(result) for result in results]
+        for alert in alerts:
+            if alert.timestamp:
+                alert.timestamp = fix_offset(alert.timestamp)
+            if alert.resolved_time:
+                alert.resolved_time = fix_offset(alert.resolved_time)
         
-        # Convert to list and fix timezone offset
-        results = [result for result in results]
-        for result in results:
-            if result.get("timestamp"):
-                result["timestamp"] = fix_offset(result["timestamp"])
-            if result.get("resolved_time"):
-                result["resolved_time"] = fix_offset(result["resolved_time"])
-        
-        return total_count, [AlertModel(**result) for result in results]
+        return total_count, alerts, next_cursor
     except Exception as e:
         logger.error(f"Error reading alerts: {e}")
         traceback.print_exc()
-        return 0, []
+        return 0, [], None
+
+def resolve_alerts(tenant_id: str, resolved_by: str, devices: list[str] = None) -> int:
+    """Resolve the open alerts of the given devices, or of the whole tenant"""
+    return alert_lifecycle.resolve(tenant_id, resolved_by, devices)
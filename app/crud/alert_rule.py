@@ -0,0 +1,34 @@
+import bson
+from database.mongo import get_alert_rules_collection
+from models.alert_rule import AlertRule, AlertRuleCreate, AlertRuleEdit
+from services.rules_engine import rules_engine
+
+def create_alert_rule(tenant_id: str, rule: AlertRuleCreate) -> AlertRule:
+    new_rule = get_alert_rules_collection(tenant_id).insert_one(rule.model_dump())
+    rules_engine.reload(tenant_id)
+    return AlertRule(_id=str(new_rule.inserted_id), **rule.model_dump())
+
+def read_alert_rules(tenant_id: str) -> list[AlertRule]:
+    return [AlertRule(**{**rule, "_id": str(rule["_id"])}) for rule in get_alert_rules_collection(tenant_id).find()]
+
+def update_alert_rule(tenant_id: str, rule_id: str, rule: AlertRuleEdit) -> AlertRule | None:
+    if not bson.ObjectId.is_valid(rule_id):
+        return None
+    updated = get_alert_rules_collection(tenant_id).find_one_and_update(
+        {"_id": bson.ObjectId(rule_id)},
+        {"$set": rule.model_dump(exclude_none=True, exclude_unset=True)},
+        return_document=True
+    )
+    if not updated:
+        return None
+    rules_engine.reload(tenant_id)
+    return AlertRule(**{**updated, "_id": str(updated["_id"])})
+
+def delete_alert_rule(tenant_id: str, rule_id: str) -> bool:
+    if not bson.ObjectId.is_valid(rule_id):
+        return False
+    result = get_alert_rules_collection(tenant_id).delete_one({"_id": bson.ObjectId(rule_id)})
+    if not result.deleted_count:
+        return False
+    rules_engine.reload(tenant_id)
+    return True
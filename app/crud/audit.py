@@ -5,6 +5,7 @@ from models.audit import AuditLog
 from models.auth import Role
 from utils.logging import logger
 from utils import fix_offset
+from utils.pagination import Position, cached_count, find_page
 
 def append_audit_log(audit: AuditLog, role: Role = None, tenant_id: str = None):
     if not role is None:
@@ -25,9 +26,14 @@ def read_audit_logs(
     resource: str = None,
     start: str = None,
     end: str = None,
-    skip: int = 0,
-    limit: int = 100
-) -> tuple[int, list[AuditLog]]:
+    after: Position = None,
+    limit: int = 100,
+    count: bool = False
+) -> tuple[int | None, list[AuditLog], str | None]:
+    """
+    Audit logs newest first, after the position of a cursor. Returns the total (when
+    `count`, cached), the page and the cursor of the next page.
+    """
     try:
         query = {}
         if username:
@@ -45,22 +51,17 @@ def read_audit_logs(
             
         audit_collection = get_audit_collection(tenant_id)
         
-        # Get total count for pagination metadata
-        total_count = audit_collection.count_documents(query)
+        total_count = cached_count(audit_collection, query) if count else None
         
-        # Get paginated results sorted by timestamp descending (latest first)
-        results = audit_collection.find(query).sort("timestamp", -1).skip(skip).limit(limit)
-        
-        if results is None:
-            return 0, []
+        # Resume after the last log of the previous page (latest first)
+        results, next_cursor = find_page(audit_collection, query, after, limit)
         
         # The results is in UTC+0, convert and offset to local timezone
-        results = [result for result in results]
         for result in results:
             result["timestamp"] = fix_offset(result["timestamp"])
         
-        return total_count, [AuditLog(**result) for result in results]
+        return total_count, [AuditLog(**result) for result in results], next_cursor
     except Exception as e:
         logger.error(f"Error reading audit logs: {e}")
         traceback.print_exc()
-        return 0, []
\ No newline at end of file
+        return 0, [], None
\ No newline at end of file
@@ -1,10 +1,13 @@
 import bson
+import time
 from fastapi import HTTPException
 from database.mongo import device_collection
 from models.auth import Role, User
 from models.device import DeviceCreate, DeviceConfigure, Device, DeviceEdit
 from services.cache_service import cache_service
+from utils.config import DEVICE_CACHE_WARMUP
 from utils.logging import logger
+from utils.metrics import metrics
 
 def create_device(device: DeviceCreate) -> Device:
     new_device = device_collection.insert_one(device.model_dump())
@@ -62,10 +65,20 @@ async def init():
             db: Database session
         """
         try:
-            logger.info("Initializing device cache from database")
-            devices = await get_all_devices()
-            cache_service.clear()
-            cache_service.cache_device(devices)
+            logger.info(f"Initializing device cache from database ({DEVICE_CACHE_WARMUP})")
+            start = time.perf_counter()
+            if DEVICE_CACHE_WARMUP == "full":
+                devices = await get_all_devices()
+                cache_service.clear()
+                cache_service.cache_device(devices)
+                stats = {"added": len(devices)}
+            else:
+                # Stream devices and only write what differs from the cache
+                cursor = device_collection.find().batch_size(1000)
+                stats = cache_service.warm((Device(**device) for device in cursor), restart=True)
+            elapsed = time.perf_counter() - start
+            metrics.histogram("device_cache.warmup_ms").observe(elapsed * 1000)
+            logger.info(f"Device cache warmed in {elapsed:.2f}s: {stats}")
         except Exception as e:
             logger.error(f"Failed to initialize device cache: {e}")
 
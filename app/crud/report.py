@@ -1,10 +1,9 @@
 from database.mongo import device_collection, get_sensors_collection
 from models.auth import User
 from models.device import Device
-from models.report import SensorModel, SensorFull
+from models.report import SensorFull
 from datetime import datetime, timedelta
 from database.redis import get_redis_connection
-import json
 import pytz
 from crud.device import verify_owner
 from services.cache_service import cache_service
@@ -12,31 +11,23 @@ from services.cache_service import cache_service
 local_tz = pytz.timezone('Asia/Ho_Chi_Minh')  # Or your local timezone
 
 def cache_unknown_device(mac: str) -> None:
-    redis = get_redis_connection()
+    pipe = get_redis_connection().pipeline(transaction=False)
     # Store as member of the set unknown_devices with expiration of 1 minute
-    redis.sadd("unknown_devices", mac)
-    redis.expire("unknown_devices", 60)
+    pipe.sadd("unknown_devices", mac)
+    pipe.expire("unknown_devices", 60)
+    pipe.execute()
 
-def add_data(data: SensorModel, tenant_id: str) -> str:
+def add_data_many(data: list[dict], tenant_id: str) -> int:
     """
-    Insert sensor data into MongoDB, avoiding redundancy.
-    Assumes data has already been preprocessed and contains tenant_id.
+    Bulk insert sensor documents into MongoDB with a single unordered insert_many.
+    Deduplication is done upstream by the sensor write buffer, so no lookup is issued here.
+    Returns the number of inserted documents.
     """
-    # Get the sensor collection for the tenant
+    if not data:
+        return 0
     sensor_collection = get_sensors_collection(tenant_id)
-    
-    # Check if sensor data with same device_id and timestamp already exists
-    existing = sensor_collection.find_one({
-        "device_id": data.device_id,
-        "timestamp": data.timestamp
-    })
-    
-    if existing:
-        return existing.get("_id")
-        
-    # Insert the sensor data
-    sensor = sensor_collection.insert_one(data.model_dump())
-    return sensor.inserted_id
+    result = sensor_collection.insert_many(data, ordered=False)
+    return len(result.inserted_ids)
 
 def mac2device(mac: str) -> dict:
     # Check if the device exists in the cache
@@ -62,18 +53,12 @@ def mac2device(mac: str) -> dict:
 
 def get_cache_status() -> list[SensorFull]:
     devices = []
-    redis = get_redis_connection()
-    if redis:
-        keys = redis.keys(f"device:*")
-        if not keys:
-            return []
-        device_data = redis.mget(keys)
-        for data in device_data:
-            if data:
-                try:
-                    devices.append(SensorFull(**json.loads(data)))
-                except Exception:
-                    pass
+    for chunk in cache_service.iter_devices():
+        for data in chunk:
+            try:
+                devices.append(SensorFull(**data))
+            except Exception:
+                pass
     return devices
 
 def agg_monthly(current_user: User, device_id: str, start_date: datetime = None, end_date: datetime = None):
@@ -22,6 +22,13 @@ def get_users_collection() -> Collection:
 def get_tenants_collection() -> Collection:
     return client["scada_db"]["tenants"]
 
+# Alert indexes, the last two serve the unresolved alert view, per device or per tenant, newest first
+ALERT_INDEXES = [
+    IndexModel([("metadata.device_id", 1), ("timestamp", 1)], name="mac_timestamp_idx"),
+    IndexModel([("metadata.resolved_time", 1), ("metadata.device_id", 1), ("timestamp", -1)], name="resolved_device_timestamp_idx"),
+    IndexModel([("metadata.device_id", 1), ("metadata.resolved_time", 1), ("timestamp", -1)], name="device_resolved_timestamp_idx"),
+]
+
 # Resources for each tenant
 def create_tenant_db(tenant_id: str) -> Collection:
     db = client["tenant_" + tenant_id]
@@ -34,9 +41,7 @@ def create_tenant_db(tenant_id: str) -> Collection:
         IndexModel([("metadata.device_id", 1), ("metadata.mac", 1), ("timestamp", 1)], name="mac_timestamp_idx")
     ])
 
-    create_time_collection(db, "alerts", indexes=[
-        IndexModel([("metadata.device_id", 1), ("timestamp", 1)], name="mac_timestamp_idx")
-    ])
+    create_time_collection(db, "alerts", indexes=ALERT_INDEXES)
 
 def delete_tenant_db(tenant_id: str):
     client.drop_database("tenant_" + tenant_id)
@@ -93,6 +98,9 @@ def get_alerts_collection(tenant_id: str) -> Collection:
 def get_sensors_collection(tenant_id: str) -> Collection:
     return get_tenant_db(tenant_id)["sensors"]
 
+def get_alert_rules_collection(tenant_id: str) -> Collection:
+    return get_tenant_db(tenant_id)["alert_rules"]
+
 def get_fs() -> gridfs.GridFS:
     collection: Collection = client["scada_db"]
     return gridfs.GridFS(collection)
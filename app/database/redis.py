@@ -5,27 +5,83 @@ from typing import Callable, Coroutine
 from redis.exceptions import ConnectionError
 
 from utils.config import REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_PASSWORD
+from utils.config import REDIS_MAX_CONNECTIONS, REDIS_POOL_TIMEOUT, REDIS_SOCKET_TIMEOUT, REDIS_CONNECT_TIMEOUT, REDIS_HEALTH_CHECK_INTERVAL
 from utils.logging import logger
+from utils.metrics import metrics
 
-# Existing synchronous connection
-def get_redis_connection():
-    return redis.Redis(
+# One pool per process, shared by every module. Created lazily so scripts and
+# worker processes work without the API lifespan; init_redis() creates them up front.
+_pool: redis.BlockingConnectionPool | None = None
+_client: redis.Redis | None = None
+_async_pool: redis.asyncio.BlockingConnectionPool | None = None
+_async_client: redis.asyncio.Redis | None = None
+
+def _pool_options() -> dict:
+    return dict(
         host=REDIS_HOST,
         port=REDIS_PORT,
         db=REDIS_DB,
         password=REDIS_PASSWORD,
-        decode_responses=True
+        decode_responses=True,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        # Wait this long for a free connection instead of failing when the pool is exhausted
+        timeout=REDIS_POOL_TIMEOUT,
+        # 0 disables the read timeout, pub/sub listeners block on reads
+        socket_timeout=REDIS_SOCKET_TIMEOUT or None,
+        socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+        socket_keepalive=True,
+        health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
     )
 
+def _idle_connections(pool: redis.BlockingConnectionPool) -> int:
+    return sum(1 for connection in list(pool.pool.queue) if connection is not None)
+
+def get_pool() -> redis.BlockingConnectionPool:
+    global _pool
+    if _pool is None:
+        _pool = redis.BlockingConnectionPool(**_pool_options())
+        metrics.gauge("redis.pool.created", lambda: len(_pool._connections))
+        metrics.gauge("redis.pool.idle", lambda: _idle_connections(_pool))
+        metrics.gauge("redis.pool.in_use", lambda: len(_pool._connections) - _idle_connections(_pool))
+    return _pool
+
+def get_async_pool() -> redis.asyncio.BlockingConnectionPool:
+    global _async_pool
+    if _async_pool is None:
+        _async_pool = redis.asyncio.BlockingConnectionPool(**_pool_options())
+        metrics.gauge("redis.async_pool.idle", lambda: len(_async_pool._available_connections))
+        metrics.gauge("redis.async_pool.in_use", lambda: len(_async_pool._in_use_connections))
+    return _async_pool
+
+# Existing synchronous connection
+def get_redis_connection() -> redis.Redis:
+    global _client
+    if _client is None:
+        _client = redis.Redis(connection_pool=get_pool())
+    return _client
+
 # New asynchronous connection
-async def get_async_redis_connection():
-    return redis.asyncio.Redis(
-        host=REDIS_HOST,
-        port=REDIS_PORT,
-        db=REDIS_DB,
-        password=REDIS_PASSWORD,
-        decode_responses=True
-    )
+async def get_async_redis_connection() -> redis.asyncio.Redis:
+    global _async_client
+    if _async_client is None:
+        _async_client = redis.asyncio.Redis(connection_pool=get_async_pool())
+    return _async_client
+
+def init_redis() -> None:
+    """Create the shared pools and check the server is reachable"""
+    get_redis_connection().ping()
+    get_async_pool()
+    logger.info(f"Redis pools ready (max {REDIS_MAX_CONNECTIONS} connections each)")
+
+async def close_redis() -> None:
+    """Close every pooled connection, called on shutdown"""
+    global _pool, _client, _async_pool, _async_client
+    if _async_pool is not None:
+        await _async_pool.disconnect()
+    if _pool is not None:
+        _pool.disconnect()
+    _pool = _client = _async_pool = _async_client = None
+    logger.info("Redis pools closed")
 
 # Add a refresh token into Redis list with expiration time
 def set_refresh_token(token, expires: timedelta):
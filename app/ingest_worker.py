@@ -0,0 +1,245 @@
+"""
+Standalone multi-process ingest for device telemetry.
+
+A dispatcher process holds the MQTT connection and routes every message to one of
+N worker processes by a hash of the device MAC, so all messages of a device are
+processed in order by the same worker. Each worker runs the normal ingest pipeline
+(services.mqtt.Client.process_message) with its own MongoDB/Redis connections.
+
+With MQTT_PERSISTENT_SESSION the dispatcher keeps a session as
+<MQTT_INGEST_CLIENT_ID>-<MQTT_INSTANCE_ID> and subscribes at QoS 1. Exactly one
+dispatcher may own that session, so every running instance needs its own
+MQTT_INSTANCE_ID. Workers report on a shared ack queue when a message is done
+(its readings written or spooled), and the dispatcher acknowledges it in order, so
+messages in flight or queued on the broker during a restart are redelivered.
+Without it, delivery is at most once: anything queued in the dispatcher or the
+workers when they stop is lost.
+
+Run it next to the API with MQTT_INGEST_ENABLED=false set for the API process:
+
+    python ingest_worker.py --workers 8
+"""
+import argparse
+import itertools
+import multiprocessing
+import os
+import queue
+import random
+import signal
+import threading
+import zlib
+from typing import Dict
+from paho.mqtt import client as mqtt_client
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+from services.ingest import AckTracker, Delivery
+from utils.config import MQTT_BROKER, MQTT_PORT, MQTT_INGEST_TOPICS, INGEST_QUEUE_SIZE, INGEST_PUT_TIMEOUT, SPOOL_DIR
+from utils.config import MQTT_PERSISTENT_SESSION, MQTT_SESSION_EXPIRY, MQTT_RECEIVE_MAXIMUM, MQTT_INGEST_CLIENT_ID, MQTT_INSTANCE_ID
+from utils.logging import logger
+
+def partition(mac: str, workers: int) -> int:
+    """Stable worker index for a device MAC"""
+    return zlib.crc32(mac.encode()) % workers
+
+class WorkerDelivery:
+    """
+    A dispatcher delivery as seen by a worker, with the interface of services.ingest.Delivery.
+    The last release reports the message as done on the ack queue.
+    """
+    __slots__ = ("seq", "_holds", "_acks")
+    _lock = threading.Lock()
+
+    def __init__(self, seq: int, acks):
+        self.seq = seq
+        self._holds = 1
+        self._acks = acks
+
+    def hold(self) -> "WorkerDelivery":
+        with self._lock:
+            self._holds += 1
+        return self
+
+    def release(self) -> None:
+        with self._lock:
+            self._holds -= 1
+            done = self._holds == 0
+        if done:
+            self._acks.put(self.seq)
+
+class Dispatcher(mqtt_client.Client):
+    """Receives device messages and routes them to worker queues by MAC"""
+    def __init__(self, queues: list, acks=None, put_timeout: float = INGEST_PUT_TIMEOUT):
+        self.persistent = MQTT_PERSISTENT_SESSION and acks is not None
+        if self.persistent:
+            self.ID = f"{MQTT_INGEST_CLIENT_ID}-{MQTT_INSTANCE_ID}"
+            super().__init__(mqtt_client.CallbackAPIVersion.VERSION2, client_id=self.ID,
+                             protocol=mqtt_client.MQTTv5, manual_ack=True)
+        else:
+            self.ID = "ingest-" + str(random.randint(100, 999))
+            super().__init__(mqtt_client.CallbackAPIVersion.VERSION2, client_id=self.ID)
+        self.qos = 1 if self.persistent else 0
+        self.queues = queues
+        self.acks = acks
+        self.put_timeout = put_timeout
+        self.dropped = 0
+        self.tracker = AckTracker(self.ack)
+        # Deliveries handed to the workers, by sequence number
+        self._deliveries: Dict[int, Delivery] = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._ack_thread: threading.Thread | None = None
+
+    def connect(self, host: str, port: int, keepalive: int = 60):
+        if not self.persistent:
+            return super().connect(host, port, keepalive)
+        properties = Properties(PacketTypes.CONNECT)
+        properties.SessionExpiryInterval = MQTT_SESSION_EXPIRY
+        properties.ReceiveMaximum = MQTT_RECEIVE_MAXIMUM
+        return super().connect(host, port, keepalive, clean_start=False, properties=properties)
+
+    def on_connect(self, client, userdata, flags, reason_code, properties=None):
+        logger.info(f"Ingest dispatcher connected with result code {reason_code}")
+        if self.persistent:
+            # Packet ids of the old connection are void, the broker redelivers those messages
+            forgotten = self.tracker.reset()
+            with self._lock:
+                self._deliveries.clear()
+            logger.info(f"MQTT session present: {flags.session_present}, {forgotten} unacknowledged messages left for redelivery")
+        for topic in MQTT_INGEST_TOPICS:
+            self.subscribe(topic, self.qos)
+
+    def on_disconnect(self, client, userdata, flags, reason_code, properties=None):
+        logger.info(f"Ingest dispatcher disconnected with result code {reason_code}")
+
+    def on_message(self, client, userdata, message):
+        parts = message.topic.split("/")
+        if len(parts) < 3:
+            logger.error(f"Unknown topic: {message.topic}")
+            return
+        seq = None
+        if self.persistent and message.qos:
+            seq = next(self._seq)
+            with self._lock:
+                self._deliveries[seq] = self.tracker.track(message.mid, message.qos)
+        q = self.queues[partition(parts[1], len(self.queues))]
+        try:
+            q.put((message.topic, message.payload, seq), timeout=self.put_timeout)
+        except queue.Full:
+            self.dropped += 1
+            logger.warning(f"Ingest worker queue full, dropped message on {message.topic}")
+            # Acknowledged like the in-process pipeline drops, so it does not pin the in-flight window
+            self._done(seq)
+
+    def _done(self, seq: int | None) -> None:
+        if seq is None:
+            return
+        with self._lock:
+            delivery = self._deliveries.pop(seq, None)
+        # None if the delivery belongs to a previous connection
+        if delivery:
+            delivery.release()
+
+    def _collect_acks(self) -> None:
+        while True:
+            seq = self.acks.get()
+            if seq is None:
+                break
+            self._done(seq)
+
+    def start_acks(self) -> None:
+        """Acknowledge the messages the workers report as done, in a background thread"""
+        if self.persistent and not self._ack_thread:
+            self._ack_thread = threading.Thread(target=self._collect_acks, name="ingest-acks", daemon=True)
+            self._ack_thread.start()
+
+    def stop_acks(self) -> None:
+        if self._ack_thread:
+            self.acks.put(None)
+            self._ack_thread.join(timeout=5)
+            self._ack_thread = None
+
+def worker_main(index: int, q: multiprocessing.Queue, acks: multiprocessing.Queue) -> None:
+    """Entry point of a worker process"""
+    # The parent process coordinates shutdown
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Imported here so every process opens its own database connections
+    from services.cache_service import cache_service
+    from services.mqtt import client
+    from services.sensor_buffer import sensor_buffer
+    from services.rules_engine import rules_engine
+    from services.spool import spool
+
+    logger.info(f"Ingest worker {index} started (pid {os.getpid()})")
+    # Every worker owns a stable spool directory, picked up again after a restart
+    spool.directory = os.path.join(SPOOL_DIR, f"worker-{index}")
+    spool.start()
+    sensor_buffer.start()
+    cache_service.start_invalidation_listener()
+    rules_engine.start_reload_listener()
+    client.pipeline.start()
+    try:
+        while True:
+            item = q.get()
+            if item is None:
+                break
+            topic, payload, seq = item
+            client.pipeline.submit(topic, payload, WorkerDelivery(seq, acks) if seq is not None else None)
+    finally:
+        client.pipeline.stop()
+        sensor_buffer.stop()
+        spool.stop()
+        cache_service.stop_invalidation_listener()
+        rules_engine.stop_reload_listener()
+        logger.info(f"Ingest worker {index} stopped")
+
+def start_workers(workers: int, queue_size: int = INGEST_QUEUE_SIZE, target=worker_main, args: tuple = ()):
+    """
+    Spawn worker processes, each fed by its own bounded queue. Workers report finished
+    deliveries on the shared ack queue.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    queues = [ctx.Queue(maxsize=queue_size) for _ in range(workers)]
+    acks = ctx.Queue()
+    processes = [
+        ctx.Process(target=target, args=(i, q, acks, *args), name=f"ingest-worker-{i}", daemon=True)
+        for i, q in enumerate(queues)
+    ]
+    for process in processes:
+        process.start()
+    return queues, acks, processes
+
+def stop_workers(queues: list, processes: list, timeout: float = 30) -> None:
+    """Ask every worker to drain and exit"""
+    for q in queues:
+        q.put(None)
+    for process in processes:
+        process.join(timeout=timeout)
+        if process.is_alive():
+            logger.warning(f"{process.name} did not stop in time, terminating")
+            process.terminate()
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-process MQTT ingest workers")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of worker processes")
+    parser.add_argument("--queue-size", type=int, default=INGEST_QUEUE_SIZE, help="Max queued messages per worker")
+    args = parser.parse_args()
+
+    queues, acks, processes = start_workers(args.workers, args.queue_size)
+    dispatcher = Dispatcher(queues, acks)
+    dispatcher.start_acks()
+
+    def shutdown(signum, frame):
+        dispatcher.disconnect()
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    try:
+        dispatcher.connect(MQTT_BROKER, MQTT_PORT, 60)
+        dispatcher.loop_forever()
+    finally:
+        logger.info(f"Stopping ingest workers ({dispatcher.dropped} messages dropped)")
+        stop_workers(queues, processes)
+        dispatcher.stop_acks()
+
+if __name__ == "__main__":
+    main()
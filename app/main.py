@@ -6,12 +6,17 @@ from routers import api_router
 from database import mongo, redis
 from database.mongo import get_users_collection
 from utils.auth import hash_password
-from utils.config import SUPERADMIN_USERNAME, SUPERADMIN_PASSWORD, SUPERADMIN_EMAIL, FRONTEND_ENDPOINT, DEBUG
+from utils.config import SUPERADMIN_USERNAME, SUPERADMIN_PASSWORD, SUPERADMIN_EMAIL, FRONTEND_ENDPOINT, DEBUG, DEVICE_SYNC_ENABLED, SCHEDULER_ENABLED
 from utils.logging import logger
 from crud.device import init
+from services.cache_service import cache_service
+from services.device_sync import device_sync
 from services.mqtt import client
-from background_tasks import check_idle_devices_task
-import asyncio
+from services.sensor_buffer import sensor_buffer
+from services.spool import spool
+from services.rules_engine import rules_engine
+from services.scheduler import scheduler
+from background_tasks import register_jobs
 
 from models.auth import Role
 from services.mqtt import client
@@ -31,30 +36,46 @@ def create_superadmin():
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     try:
-        redis.get_redis_connection()
+        redis.init_redis()
         create_superadmin()
         
         # Initialize device cache
         await init()
+        cache_service.start_invalidation_listener()
+        rules_engine.start_reload_listener()
+        if DEVICE_SYNC_ENABLED:
+            device_sync.start()
         
+        # Start sensor write buffer and the replayer of readings spooled while MongoDB was unavailable
+        spool.start()
+        sensor_buffer.start()
+
+        # Start ingest workers before any message can arrive
+        client.pipeline.start()
+
         # Start MQTT client
         client.connect()
         client.loop_start()
-        # Start background task for idle device checking
-        idle_task = asyncio.create_task(check_idle_devices_task())
+        # Start periodic jobs, each runs in one process of the cluster at a time
+        if SCHEDULER_ENABLED:
+            register_jobs()
+            scheduler.start()
         
         yield
         
-        # Clean up background task
-        idle_task.cancel()
-        try:
-            await idle_task
-        except asyncio.CancelledError:
-            pass
+        # Stop periodic jobs
+        await scheduler.stop()
             
     finally:
+        # Stop accepting, drain queued messages and flush their readings, then disconnect
+        client.drain()
+        sensor_buffer.stop()
+        spool.stop()
+        device_sync.stop()
         mongo.client.close()
-        client.disconnect()
+        cache_service.stop_invalidation_listener()
+        rules_engine.stop_reload_listener()
+        await redis.close_redis()
 
 app = FastAPI(
         title="SCADA Traffic Light System",
@@ -55,7 +55,32 @@ class AlertModel(BaseModel):
         populate_by_name = True
         arbitrary_types_allowed = True
         json_encoders = {ObjectId: str}  # Ensures ObjectId is serialized to a string
-    
+
+    def to_document(self) -> dict:
+        """
+        Alert document for MongoDB. The alerts collection is a time-series collection, which
+        only updates documents by their metaField, so the device and resolution go there.
+        """
+        document = self.model_dump(exclude={"resolved_time", "resolved_by"})
+        document["metadata"] = {
+            "device_id": self.device,
+            "resolved_time": self.resolved_time,
+            "resolved_by": self.resolved_by,
+        }
+        return document
+
+    @classmethod
+    def from_document(cls, document: dict) -> "AlertModel":
+        metadata = document.get("metadata") or {}
+        return cls(**{
+            **document,
+            "resolved_time": metadata.get("resolved_time", document.get("resolved_time")),
+            "resolved_by": metadata.get("resolved_by", document.get("resolved_by")),
+        })
+
+class AlertResolve(BaseModel):
+    # Devices whose open alerts are resolved, all devices of the tenant when empty
+    devices: list[str] = []
 
 class AlertModelFull(AlertModel):
     mac: str
@@ -0,0 +1,58 @@
+from enum import Enum
+from typing import Optional
+from bson import ObjectId
+from pydantic import BaseModel, Field
+from models.alert import AlertSeverity, DeviceState
+
+class RuleMetric(str, Enum):
+    VOLTAGE = "voltage"
+    CURRENT = "current"
+    POWER = "power"
+    POWER_FACTOR = "power_factor"
+    TOTAL_ENERGY = "total_energy"
+
+class RuleOperator(str, Enum):
+    # The rule matches when the reading is below or above the threshold
+    BELOW = "<"
+    ABOVE = ">"
+
+class AlertRule(BaseModel):
+    id: Optional[ObjectId] | Optional[str] = Field(alias="_id", default=None)
+    name: str
+    metric: RuleMetric
+    operator: RuleOperator
+    threshold: float
+    # Seconds the reading must stay beyond the threshold before the rule matches
+    duration: int = Field(0, ge=0)
+    state: DeviceState
+    severity: AlertSeverity = AlertSeverity.WARNING
+    # Device ids the rule applies to, every device of the tenant when empty
+    devices: list[str] = []
+    enabled: bool = True
+
+    class Config:
+        populate_by_name = True
+        arbitrary_types_allowed = True
+        json_encoders = {ObjectId: str}  # Ensures ObjectId is serialized to a string
+
+class AlertRuleCreate(BaseModel):
+    name: str
+    metric: RuleMetric
+    operator: RuleOperator
+    threshold: float
+    duration: int = Field(0, ge=0)
+    state: DeviceState
+    severity: AlertSeverity = AlertSeverity.WARNING
+    devices: list[str] = []
+    enabled: bool = True
+
+class AlertRuleEdit(BaseModel):
+    name: Optional[str] = None
+    metric: Optional[RuleMetric] = None
+    operator: Optional[RuleOperator] = None
+    threshold: Optional[float] = None
+    duration: Optional[int] = Field(None, ge=0)
+    state: Optional[DeviceState] = None
+    severity: Optional[AlertSeverity] = None
+    devices: Optional[list[str]] = None
+    enabled: Optional[bool] = None
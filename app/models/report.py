@@ -1,3 +1,4 @@
+from dataclasses import dataclass
 from pydantic import BaseModel, BeforeValidator
 from datetime import datetime
 from typing import Optional, Annotated
@@ -43,4 +44,61 @@ class SensorFull(SensorData):
     class Config:
         populate_by_name = True
         arbitrary_types_allowed = True
-        json_encoders = {ObjectId: str}  # Ensures ObjectId is serialized to a string
\ No newline at end of file
+        json_encoders = {ObjectId: str}  # Ensures ObjectId is serialized to a string
+
+@dataclass(slots=True)
+class SensorRecord:
+    """
+    Compact record built once per status message on the ingest hot path.
+    Serves both as the sensor document for MongoDB and as the input of status evaluation.
+    """
+    mac: str
+    device_id: str
+    device_name: str
+    tenant_id: str
+    timestamp: datetime
+    voltage: float
+    current: float
+    power: float
+    power_factor: float
+    total_energy: float
+    energy_meter: float
+    toggle: bool
+    auto: bool
+    hour_on: int
+    hour_off: int
+    minute_on: int
+    minute_off: int
+    latitude: float
+    longitude: float
+
+    def to_document(self) -> dict:
+        """Sensor document for MongoDB, same shape as SensorModel.model_dump()"""
+        return {
+            "mac": self.mac,
+            "device_id": self.device_id,
+            "timestamp": self.timestamp,
+            "voltage": self.voltage,
+            "current": self.current,
+            "power": self.power,
+            "power_factor": self.power_factor,
+            "total_energy": self.total_energy,
+            "energy_meter": self.energy_meter,
+            "toggle": self.toggle,
+        }
+
+    def sensor_fields(self) -> dict:
+        """Realtime fields written to the device cache"""
+        return {
+            "mac": self.mac,
+            "timestamp": self.timestamp,
+            "voltage": self.voltage,
+            "current": self.current,
+            "power": self.power,
+            "power_factor": self.power_factor,
+            "total_energy": self.total_energy,
+            "energy_meter": self.energy_meter,
+            "toggle": self.toggle,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+        }
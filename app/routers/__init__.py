@@ -3,12 +3,14 @@ from fastapi import APIRouter
 from .tenant import router as tenant_router
 from .auth import router as auth_router
 from .alert import router as alert_router
+from .alert_rule import router as alert_rule_router
 from .audit import router as audit_router
 from .user import router as user_router
 from .device import router as device_router
 from .report import router as report_router
 from .websocket import router as websocket_router
 from .firmware import router as firmware_router, deprecated_router
+from .debug import router as debug_router
 api_router = APIRouter(prefix="/api")
 
 api_router.include_router(tenant_router)
@@ -20,4 +22,6 @@ api_router.include_router(report_router)
 api_router.include_router(websocket_router)
 api_router.include_router(firmware_router)
 api_router.include_router(alert_router)
-api_router.include_router(deprecated_router)
\ No newline at end of file
+api_router.include_router(alert_rule_router)
+api_router.include_router(deprecated_router)
+api_router.include_router(debug_router)
\ No newline at end of file
@@ -1,11 +1,12 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import Annotated, Optional
 from datetime import datetime
 
-from crud.alert import read_alerts
-from models.alert import AlertModel, AlertSeverity, DeviceState
+from crud.alert import read_alerts, resolve_alerts
+from models.alert import AlertModel, AlertResolve, AlertSeverity, DeviceState
 from models.auth import User
 from utils.auth import Role, RoleChecker
+from utils.pagination import decode_cursor
 
 router = APIRouter(
     prefix="/alert",
@@ -21,14 +22,17 @@ def get_filtered_alerts(
     start: Optional[datetime] = Query(None, example="2022-01-01T00:00:00"),
     end: Optional[datetime] = Query(None, example="2022-12-31T23:59:59"),
     resolved: Optional[bool] = None,
-    page: int = Query(1, ge=1, description="Page number"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
     page_size: int = Query(20, ge=1, le=100, description="Items per page"),
+    count: bool = Query(False, description="Include the total, cached for a short time"),
 ):
-    # Calculate skip based on page and page_size
-    skip = (page - 1) * page_size
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    # Get total count and paginated results
-    total_count, results = read_alerts(
+    # Get the page, the cursor of the next one and optionally the total
+    total_count, results, next_cursor = read_alerts(
         tenant_id=user.tenant_id,
         device=device,
         state=state,
@@ -36,17 +40,26 @@ def get_filtered_alerts(
         start=start,
         end=end,
         resolved=resolved,
-        skip=skip,
-        limit=page_size
+        after=after,
+        limit=page_size,
+        count=count
     )
     
-    # Calculate total pages
-    total_pages = (total_count + page_size - 1) // page_size if total_count > 0 else 1
-    
     return {
         "total": total_count,
-        "page": page,
         "page_size": page_size,
-        "total_pages": total_pages,
+        "next_cursor": next_cursor,
         "items": results
     }
+
+@router.post("/resolve", response_model=dict)
+def resolve(
+    user: Annotated[User, Depends(RoleChecker(allowed_roles=[Role.ADMIN, Role.SUPERADMIN, Role.OPERATOR]))],
+    body: AlertResolve,
+):
+    """
+    Resolve the open alerts of the given devices, or of every device of the tenant when none is given.
+    """
+    if not user.tenant_id:
+        raise HTTPException(status_code=400, detail="User has no tenant")
+    return {"resolved": resolve_alerts(user.tenant_id, user.username, body.devices)}
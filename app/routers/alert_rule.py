@@ -0,0 +1,42 @@
+from typing import Annotated
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from crud.alert_rule import create_alert_rule, read_alert_rules, update_alert_rule, delete_alert_rule
+from models.alert_rule import AlertRule, AlertRuleCreate, AlertRuleEdit
+from models.auth import User
+from utils.auth import Role, RoleChecker
+
+router = APIRouter(
+    prefix="/alert-rule",
+    tags=["alert-rule"]
+)
+
+def _tenant_of(user: User) -> str:
+    if not user.tenant_id:
+        raise HTTPException(status_code=400, detail="User has no tenant")
+    return user.tenant_id
+
+@router.get("/", response_model=list[AlertRule])
+def get_rules(user: Annotated[User, Depends(RoleChecker(allowed_roles=[Role.ADMIN, Role.SUPERADMIN, Role.MONITOR]))]):
+    return read_alert_rules(_tenant_of(user))
+
+@router.post("/", response_model=AlertRule, status_code=status.HTTP_201_CREATED)
+def post_rule(user: Annotated[User, Depends(RoleChecker(allowed_roles=[Role.ADMIN, Role.SUPERADMIN]))],
+    rule: AlertRuleCreate):
+    return create_alert_rule(_tenant_of(user), rule)
+
+@router.put("/{rule_id}", response_model=AlertRule)
+def put_rule(user: Annotated[User, Depends(RoleChecker(allowed_roles=[Role.ADMIN, Role.SUPERADMIN]))],
+    rule_id: str,
+    rule: AlertRuleEdit):
+    updated = update_alert_rule(_tenant_of(user), rule_id, rule)
+    if not updated:
+        raise HTTPException(status_code=404, detail="Alert rule not found")
+    return updated
+
+@router.delete("/{rule_id}")
+def delete_rule(user: Annotated[User, Depends(RoleChecker(allowed_roles=[Role.ADMIN, Role.SUPERADMIN]))],
+    rule_id: str):
+    if not delete_alert_rule(_tenant_of(user), rule_id):
+        raise HTTPException(status_code=404, detail="Alert rule not found")
+    return status.HTTP_200_OK
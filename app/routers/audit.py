@@ -1,7 +1,7 @@
 # APIs to get audit logs, with filter for username, action, and resource (?username=, ?action=, ?resource=)
-# And with time range filter (?start=, ?end=)
+# And with time range filter (?start=, ?end=), paged with ?cursor= (next_cursor of the previous page)
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from typing import Annotated
 from datetime import datetime
 
@@ -11,6 +11,7 @@ from crud.audit import append_audit_log, read_audit_logs
 from models.audit import AuditLog
 from models.auth import User
 from utils.auth import Action, Role, RoleChecker
+from utils.pagination import decode_cursor
 
 router = APIRouter(
     prefix="/audit",
@@ -25,31 +26,31 @@ def get_filtered_audit_logs(
     resource: str | None = None,
     start: datetime | None = Query(None, example="2022-01-01T00:00:00"),
     end: datetime | None = Query(None, example="2022-12-31T23:59:59"),
-    page: int = Query(1, ge=1, description="Page number"),
+    cursor: str | None = Query(None, description="next_cursor of the previous page"),
     page_size: int = Query(20, ge=1, le=100, description="Items per page"),
+    count: bool = Query(False, description="Include the total, cached for a short time"),
 ):
-    # Calculate skip based on page and page_size
-    skip = (page - 1) * page_size
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    # Get total count and paginated results
-    total_count, results = read_audit_logs(
+    # Get the page, the cursor of the next one and optionally the total
+    total_count, results, next_cursor = read_audit_logs(
         username=username,
         action=action,
         resource=resource,
         start=start,
         end=end,
         tenant_id=user.tenant_id,
-        skip=skip,
-        limit=page_size
+        after=after,
+        limit=page_size,
+        count=count
     )
     
-    # Calculate total pages
-    total_pages = (total_count + page_size - 1) // page_size if total_count > 0 else 1
-    
     return {
         "total": total_count,
-        "page": page,
         "page_size": page_size,
-        "total_pages": total_pages,
+        "next_cursor": next_cursor,
         "items": results
     }
\ No newline at end of file
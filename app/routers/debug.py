@@ -0,0 +1,22 @@
+from typing import Annotated
+from fastapi import APIRouter, Depends
+
+from models.auth import User
+from utils.auth import Role, RoleChecker
+from utils.metrics import metrics
+
+router = APIRouter(
+    prefix="/debug",
+    tags=["debug"]
+)
+
+@router.get("/metrics", response_model=dict)
+def get_metrics(
+    _: Annotated[User, Depends(RoleChecker(allowed_roles=[Role.SUPERADMIN]))],
+    prefix: str = "",
+):
+    """
+    Current in-process counters, gauges and histogram percentiles (milliseconds for timers).
+    Use `prefix` to narrow the output, e.g. `ingest.stage.`.
+    """
+    return metrics.snapshot(prefix)
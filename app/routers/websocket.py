@@ -106,8 +106,7 @@ class ConnectionManager:
         """Send initial device states to a newly connected client"""
         try:
             # Get devices for this tenant
-            devices = cache_service.get_devices_with_states()
-            tenant_devices = [d for d in devices if d.get("tenant_id") == tenant_id]
+            tenant_devices = cache_service.get_devices_by_tenant(tenant_id)
             
             if tenant_devices:
                 # Send the initial device states
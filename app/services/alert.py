@@ -3,26 +3,21 @@
 This service is responsible for checking the status of the device and generating alerts based on the status.
 """
 import json
-from models.report import SensorFull
+from collections import defaultdict
+from models.report import SensorRecord
 from models.alert import AlertModel, AlertModelFull, DeviceState, AlertSeverity
 import pytz
-from database.mongo import get_alerts_collection
 from database.redis import get_redis_connection
 from utils import get_real_time
 from utils.logging import logger
+from utils.metrics import metrics
+from services.alert_lifecycle import alert_lifecycle
 from services.cache_service import cache_service
 from services.status_manager import determine_device_status
 from services.event_bus import event_bus
 
 local_tz = pytz.timezone('Asia/Ho_Chi_Minh')  # Or your local timezone
 
-def get_cached_alert(device_id: str) -> str:
-    """Get the device state from cache"""
-    device_data = cache_service.get_device_by_id(device_id)
-    if device_data and "state" in device_data:
-        return device_data["state"]
-    return ""
-
 # Pub/sub latest alert message
 def subscribe_alert():
     redis = get_redis_connection()
@@ -41,21 +36,30 @@ def publish_alert(message: AlertModel, tenant_id: str):
     except Exception as e:
         logger.error(f"Failed to publish alert via event bus: {e}")
 
-def process_data(data: SensorFull, tenant_id: str):
-    """Process sensor data to determine status and create alerts if needed"""
+def process_data(data: SensorRecord, tenant_id: str, schedule_status: tuple[DeviceState, AlertSeverity] | None = None):
+    """
+    Process sensor data to determine status and create alerts if needed
+    `schedule_status` is the schedule part of the status when a batch already evaluated it
+    """
     try:
         # Determine device status using the status manager
-        state, severity = determine_device_status(data)
+        with metrics.timer("ingest.stage.status", tenant_id):
+            state, severity = determine_device_status(data, schedule_status)
         device_id = data.device_id
         mac = data.mac
-        # Update the device state in the cache
-        cache_service.update_device_state(mac, state.value)
-        # Do not create an alert for normal status
+        # Update the device state in the cache, learning atomically whether it changed
+        with metrics.timer("ingest.stage.state_update", tenant_id):
+            transition = cache_service.transition_state(mac, state.value)
+        if transition is None:
+            return
+        changed, _ = transition
+        # Do not create an alert for normal status, resolve the open ones instead
         if severity == AlertSeverity.NORMAL:
+            if changed:
+                alert_lifecycle.device_recovered(tenant_id, device_id)
             return
         # Create alert only if state has changed (to avoid redundancy)
-        current_state = get_cached_alert(device_id)
-        if current_state != state.value or not current_state:
+        if changed:
             new_alert = AlertModel(
                 state=state,
                 device=device_id,
@@ -63,79 +67,57 @@ def process_data(data: SensorFull, tenant_id: str):
                 timestamp=get_real_time(),
                 severity=severity
             )
-            alert_collection = get_alerts_collection(tenant_id)
-            alert_collection.insert_one(new_alert.model_dump())
+            with metrics.timer("ingest.stage.alert_insert", tenant_id):
+                alert_lifecycle.open(tenant_id, [new_alert])
             full_alert = AlertModelFull(**new_alert.model_dump(), mac=data.mac, tenant_id=tenant_id)
-            publish_alert(full_alert, tenant_id)
+            with metrics.timer("ingest.stage.alert_publish", tenant_id):
+                publish_alert(full_alert, tenant_id)
         return
           
     except Exception as e:
         logger.error(f"Failed to process alert data: {e}")
         return
 
-def check_idle_devices() -> int:
+def check_idle_devices() -> tuple[int, list]:
     """
-    Check all devices and mark as disconnected if they've been idle for too long
-    Returns the number of devices marked as disconnected
+    Mark devices that have been idle for too long as disconnected
+    Only devices that went idle since the previous check are read, see CacheService.claim_idle_devices
+    Alerts are written with one insert per tenant and claimed batch
+    Returns the number of devices marked as disconnected and the (tenant_id, device) pairs
     """
     if not cache_service.is_available():
-        return 0
+        return 0, []
         
+    # Claimed devices are out of the last seen index, so they are returned even if a later batch fails
+    disconnected_devices = []
     try:
-        # Get all device keys
-        devices = cache_service.get_all_devices()
-        if not devices:
-            return 0, []
-            
-        # Current timestamp for comparison
-        current_time = get_real_time().timestamp()
-        disconnected_count = 0
-        disconnected_devices = []
-        # Check each device
-        for device_data in devices:
-            try:
+        cutoff = get_real_time().timestamp() - cache_service.IDLE_TIMEOUT
+        for devices in cache_service.claim_idle_devices(cutoff):
+            timestamp = get_real_time()
+            tenant_alerts: defaultdict[str, list[AlertModel]] = defaultdict(list)
+            for device_data in devices:
                 tenant_id = device_data.get("tenant_id", "")
+                device_id = device_data.get("_id", "")
+                if not (device_id and tenant_id):
+                    continue
+                # Create new alert for disconnected device
+                new_alert = AlertModel(
+                    state=DeviceState.DISCONNECTED,
+                    device=device_id,
+                    device_name=device_data.get("name", "Unknown device"),
+                    timestamp=timestamp,
+                    severity=AlertSeverity.CRITICAL
+                )
+                tenant_alerts[tenant_id].append(new_alert)
+                disconnected_devices.append((tenant_id, device_data))
 
-                # Skip devices that are already marked as disconnected
-                if device_data.get("state") == DeviceState.DISCONNECTED.value and tenant_id:
-                    cache_service.update_last_seen(device_data.get("mac"), current_time - cache_service.IDLE_TIMEOUT - 1)
-                
-                # Check if device has a last_seen timestamp and if it's too old
-                last_seen = device_data.get("last_seen")
-                if not last_seen:
-                    raise ValueError("Device has no last_seen timestamp")
-                if (current_time - float(last_seen)) > cache_service.IDLE_TIMEOUT:
-                    # Mark as disconnected
-                    device_data["state"] = DeviceState.DISCONNECTED.value
-                    
-                    # Update device in cache
-                    cache_service.update_device_state(device_data.get("mac"), DeviceState.DISCONNECTED.value)
-                    
-                    # Create new alert for disconnected device
-                    device_id = device_data.get("_id", "")
-                    device_name = device_data.get("name", "Unknown device")
-                    
-                    if device_id and tenant_id:
-                        new_alert = AlertModel(
-                            state=DeviceState.DISCONNECTED,
-                            device=device_id,
-                            device_name=device_name,
-                            timestamp=get_real_time(),
-                            severity=AlertSeverity.CRITICAL
-                        )
-                        
-                        # Save to database
-                        alert_collection = get_alerts_collection(tenant_id)
-                        alert_collection.insert_one(new_alert.model_dump())
-                        disconnected_devices.append((tenant_id, device_data))
-                        logger.info(f"Device {device_name} marked as disconnected due to inactivity")
-                        disconnected_count += 1
-                    
-            except Exception as e:
-                logger.error(f"Error checking device for idle status: {e}")
-                continue
-                
-        return disconnected_count, disconnected_devices
+            for tenant_id, alerts in tenant_alerts.items():
+                try:
+                    alert_lifecycle.open(tenant_id, alerts)
+                except Exception as e:
+                    logger.error(f"Failed to save disconnect alerts of tenant {tenant_id}: {e}")
+                logger.info(f"{len(alerts)} devices of tenant {tenant_id} marked as disconnected due to inactivity")
+        return len(disconnected_devices), disconnected_devices
     except Exception as e:
         logger.error(f"Error checking for idle devices: {e}")
-        return 0
\ No newline at end of file
+        return len(disconnected_devices), disconnected_devices
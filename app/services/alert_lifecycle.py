@@ -0,0 +1,203 @@
+"""
+## Alert Lifecycle
+Opens alerts and resolves them, automatically when a device returns to a normal
+state or in bulk on request.
+
+Redis tracks which devices have unresolved alerts, so recoveries cost nothing when
+there is nothing to resolve:
+- `alerts_open:<tenant_id>`: set of device ids with unresolved alerts
+- `alerts_resolving:<tenant_id>`: devices back to normal, resolved by the next flush
+- `alerts_resolving`: set of tenants with pending resolutions
+
+The flush runs as a scheduler job and resolves each tenant's recovered devices with
+one update_many on the alert metadata, see AlertModel.to_document.
+
+Alerts saved before the metadata layout keep `device` and `resolved_time` at the top
+level, which a time-series collection cannot update. `migrate_legacy` rewrites them in
+the current layout once per tenant (`alerts_migrated`: set of migrated tenants).
+"""
+from typing import Iterable, List, Optional
+from pymongo.errors import PyMongoError
+from database.mongo import ALERT_INDEXES, get_alerts_collection, tenant_collection
+from database.redis import get_redis_connection
+from models.alert import AlertModel
+from utils import get_real_time
+from utils.logging import logger
+from utils.metrics import metrics
+
+# Resolver recorded on alerts closed by a device recovery
+AUTO_RESOLVER = "system"
+
+# Alerts rewritten per insert_many by the legacy migration
+MIGRATE_BATCH = 1000
+
+# Move a device from the open set to the pending set. KEYS: open, resolving, tenants. ARGV: device, tenant
+RECOVER_SCRIPT = """
+if redis.call('SMOVE', KEYS[1], KEYS[2], ARGV[1]) == 1 then
+    redis.call('SADD', KEYS[3], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+class AlertLifecycle:
+    OPEN_PREFIX = "alerts_open:"
+    RESOLVING_PREFIX = "alerts_resolving:"
+    RESOLVING_TENANTS = "alerts_resolving"
+    MIGRATED_TENANTS = "alerts_migrated"
+
+    def __init__(self):
+        self.redis = get_redis_connection()
+        self._recover_script = self.redis.register_script(RECOVER_SCRIPT)
+        self._indexed: set[str] = set()
+
+        self._opened = metrics.counter("alerts.opened")
+        self._resolved = metrics.counter("alerts.resolved")
+        self._migrated = metrics.counter("alerts.migrated")
+
+    def ensure_indexes(self, tenant_id: str) -> None:
+        """Create the alert indexes of a tenant, once per process"""
+        if tenant_id in self._indexed:
+            return
+        try:
+            get_alerts_collection(tenant_id).create_indexes(ALERT_INDEXES)
+            self._indexed.add(tenant_id)
+        except PyMongoError as e:
+            logger.error(f"Failed to create alert indexes of tenant {tenant_id}: {e}")
+
+    def open(self, tenant_id: str, alerts: List[AlertModel]) -> None:
+        """
+        Save alerts with one insert and mark their devices as having open alerts.
+        Raises PyMongoError if the insert fails.
+        """
+        if not alerts:
+            return
+        self.ensure_indexes(tenant_id)
+        try:
+            # A failed document does not stop the others
+            get_alerts_collection(tenant_id).insert_many([alert.to_document() for alert in alerts], ordered=False)
+        finally:
+            self.redis.sadd(f"{self.OPEN_PREFIX}{tenant_id}", *{alert.device for alert in alerts})
+            self._opened.inc(len(alerts))
+
+    def device_recovered(self, tenant_id: str, device_id: str) -> None:
+        """Queue the open alerts of a device back to normal for resolution"""
+        try:
+            self._recover_script(
+                keys=[f"{self.OPEN_PREFIX}{tenant_id}", f"{self.RESOLVING_PREFIX}{tenant_id}", self.RESOLVING_TENANTS],
+                args=[device_id, tenant_id],
+            )
+        except Exception as e:
+            logger.error(f"Failed to queue alert resolution of device {device_id}: {e}")
+
+    def _resolve(self, tenant_id: str, devices: Optional[Iterable[str]], resolved_by: str) -> int:
+        query = {"metadata.resolved_time": None}
+        if devices is not None:
+            query["metadata.device_id"] = {"$in": list(devices)}
+        result = get_alerts_collection(tenant_id).update_many(query, {"$set": {
+            "metadata.resolved_time": get_real_time(),
+            "metadata.resolved_by": resolved_by,
+        }})
+        self._resolved.inc(result.modified_count)
+        return result.modified_count
+
+    def flush(self) -> int:
+        """Resolve the alerts of every recovered device, one update per tenant. Returns the alerts resolved."""
+        resolved = 0
+        for tenant_id in self.redis.smembers(self.RESOLVING_TENANTS):
+            self.redis.srem(self.RESOLVING_TENANTS, tenant_id)
+            key = f"{self.RESOLVING_PREFIX}{tenant_id}"
+            pipe = self.redis.pipeline()
+            pipe.smembers(key)
+            pipe.delete(key)
+            devices, _ = pipe.execute()
+            if not devices:
+                continue
+            # Devices that raised a new alert since they recovered stay open until the next recovery
+            pipe = self.redis.pipeline(transaction=False)
+            for device in devices:
+                pipe.sismember(f"{self.OPEN_PREFIX}{tenant_id}", device)
+            devices = [device for device, reopened in zip(devices, pipe.execute()) if not reopened]
+            if not devices:
+                continue
+            try:
+                resolved += self._resolve(tenant_id, devices, AUTO_RESOLVER)
+            except PyMongoError as e:
+                logger.error(f"Failed to resolve alerts of tenant {tenant_id}: {e}")
+                pipe = self.redis.pipeline()
+                pipe.sadd(key, *devices)
+                pipe.sadd(self.RESOLVING_TENANTS, tenant_id)
+                pipe.execute()
+        if resolved:
+            logger.info(f"Resolved {resolved} alerts of recovered devices")
+        return resolved
+
+    def resolve(self, tenant_id: str, resolved_by: str, devices: Optional[List[str]] = None) -> int:
+        """
+        Resolve the open alerts of the given devices, or of every device of the tenant.
+        Returns the number of alerts resolved.
+        """
+        self.ensure_indexes(tenant_id)
+        count = self._resolve(tenant_id, devices or None, resolved_by)
+        pipe = self.redis.pipeline()
+        if devices:
+            pipe.srem(f"{self.OPEN_PREFIX}{tenant_id}", *devices)
+            pipe.srem(f"{self.RESOLVING_PREFIX}{tenant_id}", *devices)
+        else:
+            pipe.delete(f"{self.OPEN_PREFIX}{tenant_id}", f"{self.RESOLVING_PREFIX}{tenant_id}")
+        pipe.execute()
+        logger.info(f"{resolved_by} resolved {count} alerts of tenant {tenant_id}")
+        return count
+
+    def _migrate_tenant(self, tenant_id: str) -> int:
+        collection = get_alerts_collection(tenant_id)
+        # Legacy alerts have no metadata, the only field deletes may filter on
+        legacy = {"metadata": None}
+        migrated, batch, open_devices = 0, [], set()
+        for document in collection.find(legacy):
+            alert = AlertModel.from_document(document)
+            if alert.resolved_time is None:
+                open_devices.add(alert.device)
+            batch.append(alert.to_document())
+            if len(batch) >= MIGRATE_BATCH:
+                collection.insert_many(batch, ordered=False)
+                migrated += len(batch)
+                batch = []
+        if batch:
+            collection.insert_many(batch, ordered=False)
+            migrated += len(batch)
+        if migrated:
+            # Rewritten copies are in place, a failure from here on leaves duplicates, never loses alerts
+            self.redis.sadd(self.MIGRATED_TENANTS, tenant_id)
+            collection.delete_many(legacy)
+            if open_devices:
+                # Recoveries resolve the migrated open alerts too
+                self.redis.sadd(f"{self.OPEN_PREFIX}{tenant_id}", *open_devices)
+        return migrated
+
+    def migrate_legacy(self) -> int:
+        """
+        Rewrite the alerts saved before the metadata layout, once per tenant.
+        Runs as a scheduler job. Returns the alerts migrated.
+        """
+        done = self.redis.smembers(self.MIGRATED_TENANTS)
+        migrated = 0
+        for tenant in tenant_collection.find({}, {"_id": 1}):
+            tenant_id = str(tenant["_id"])
+            if tenant_id in done:
+                continue
+            try:
+                self.ensure_indexes(tenant_id)
+                count = self._migrate_tenant(tenant_id)
+                self.redis.sadd(self.MIGRATED_TENANTS, tenant_id)
+            except PyMongoError as e:
+                logger.error(f"Failed to migrate legacy alerts of tenant {tenant_id}: {e}")
+                continue
+            if count:
+                logger.info(f"Migrated {count} legacy alerts of tenant {tenant_id}")
+            self._migrated.inc(count)
+            migrated += count
+        return migrated
+
+# Create a singleton instance
+alert_lifecycle = AlertLifecycle()
@@ -1,31 +1,141 @@
 """
 ## Cache Service
 This service manages caching for IoT devices to reduce database access.
+
+Each device is a Redis hash `device:<mac>` with one JSON-encoded value per field, so
+sensor fields, state and last_seen are written in place without a read-modify-write
+of the whole device. Devices still stored as a single JSON string (the previous
+layout) are converted to a hash the first time they are touched.
+
+Secondary indexes are kept next to the devices:
+- `device_idx:id`: hash of device id -> MAC
+- `tenant_devices:<tenant_id>`: set of the tenant's MACs
+- `device_last_seen`: sorted set of MAC -> last_seen for devices that are not disconnected
+- `devices_disconnected`: set of MACs marked disconnected by the idle check
+
+Device metadata read on the ingest path (DEVICE_INFO_FIELDS) is also kept in an
+in-process L1 cache. Every process listens on `cache_invalidate:device` and drops
+entries when any process changes or removes a device.
 """
 import json
+import time
+from models.alert import DeviceState
 from models.device import Device
 from utils import get_real_time
 from utils.logging import logger
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, Iterable, Iterator, List, Tuple
 from fastapi.encoders import jsonable_encoder
 from utils import config
-import redis
-from redis.exceptions import RedisError
-from utils.config import REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_PASSWORD
+from redis.exceptions import RedisError, ResponseError
+from database.redis import get_redis_connection
 from services.event_bus import event_bus
-from utils.serializers import json_serialize
+from services.local_cache import LocalCache
+from utils.config import DEVICE_L1_SIZE, DEVICE_L1_TTL
+from utils.serializers import DateTimeEncoder
+
+# Device fields needed to build a sensor record, see services.decoder.build_record
+DEVICE_INFO_FIELDS = ("_id", "mac", "name", "tenant_id", "auto", "hour_on", "hour_off", "minute_on", "minute_off")
+# Configuration fields compared by the warmup. `toggle` is left out: devices report it.
+WARM_FIELDS = DEVICE_INFO_FIELDS
+# Realtime fields read by the warmup to restore the idle tracking
+IDLE_FIELDS = ("state", "last_seen")
+
+# Update fields of an existing device only, so late updates never recreate a deleted device.
+# A new last_seen also refreshes the device in the last seen index. A disconnected device
+# stays out of it: only a state transition (TRANSITION_STATE_SCRIPT) reconnects it, so the
+# idle check never claims, and alerts, the same disconnection twice.
+# KEYS: device, last seen index, disconnected set
+# ARGV: ttl, return the full device (1/0), mac, last_seen or '', field, value, ...
+UPDATE_DEVICE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 5))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+if ARGV[4] ~= '' and redis.call('SISMEMBER', KEYS[3], ARGV[3]) == 0 then
+    redis.call('ZADD', KEYS[2], ARGV[4], ARGV[3])
+end
+if ARGV[2] == '1' then
+    return redis.call('HGETALL', KEYS[1])
+end
+return 1
+"""
+
+# Set the device state, and last_seen unless it is empty, in one atomic step.
+# KEYS: device, last seen index, disconnected set
+# ARGV: ttl, state, last_seen, mac. Returns {changed (1/0), previous state, field, value, ...}
+TRANSITION_STATE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+local previous = redis.call('HGET', KEYS[1], 'state')
+if ARGV[3] ~= '' then
+    redis.call('HSET', KEYS[1], 'state', ARGV[2], 'last_seen', ARGV[3])
+    redis.call('ZADD', KEYS[2], ARGV[3], ARGV[4])
+    redis.call('SREM', KEYS[3], ARGV[4])
+else
+    redis.call('HSET', KEYS[1], 'state', ARGV[2])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+local changed = 0
+if previous ~= ARGV[2] then
+    changed = 1
+end
+local result = {changed, previous or ''}
+for _, item in ipairs(redis.call('HGETALL', KEYS[1])) do
+    table.insert(result, item)
+end
+return result
+"""
+
+# Move devices last seen at or before a cutoff from the last seen index to the
+# disconnected set and mark them disconnected, so each idle period is claimed once.
+# Device keys are built from the prefix, which needs a single Redis node.
+# KEYS: last seen index, disconnected set
+# ARGV: cutoff, max devices, state, device key prefix
+# Returns {devices taken from the index, claimed mac, ...}
+CLAIM_IDLE_SCRIPT = """
+local macs = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+local result = {#macs}
+for _, mac in ipairs(macs) do
+    redis.call('ZREM', KEYS[1], mac)
+    local key = ARGV[4] .. mac
+    if redis.call('EXISTS', key) == 1 then
+        redis.call('HSET', key, 'state', ARGV[3])
+        redis.call('SADD', KEYS[2], mac)
+        table.insert(result, mac)
+    end
+end
+return result
+"""
+
+def encode_fields(data: Dict[str, Any]) -> Dict[str, str]:
+    """JSON-encode every value of a device dict for HSET"""
+    return {field: json.dumps(value, cls=DateTimeEncoder) for field, value in data.items()}
+
+def decode_fields(fields: Dict[str, str]) -> Dict[str, Any]:
+    """Decode a hash read with HGETALL back into a device dict"""
+    return {field: json.loads(value) for field, value in fields.items()}
+
+def is_wrong_type(e: Exception) -> bool:
+    return isinstance(e, ResponseError) and "WRONGTYPE" in str(e)
 
 class CacheService:
     def __init__(self):
-        self.redis = redis.Redis(
-            host=REDIS_HOST,
-            port=REDIS_PORT,
-            db=REDIS_DB,
-            password=REDIS_PASSWORD
-        )
+        self.redis = get_redis_connection()
         self.DEVICE_KEY_PREFIX = "device:"
+        self.DEVICE_ID_INDEX = "device_idx:id"
+        self.TENANT_DEVICES_PREFIX = "tenant_devices:"
+        self.LAST_SEEN_INDEX = "device_last_seen"
+        self.DISCONNECTED_SET = "devices_disconnected"
         self.DEVICE_TTL = 60 * 60 * 24 # 24 hours
         self.IDLE_TIMEOUT = config.IDLE_TIME
+        self.INVALIDATE_CHANNEL = "cache_invalidate:device"
+        self._update_script = self.redis.register_script(UPDATE_DEVICE_SCRIPT)
+        self._transition_script = self.redis.register_script(TRANSITION_STATE_SCRIPT)
+        self._claim_script = self.redis.register_script(CLAIM_IDLE_SCRIPT)
+        self.local = LocalCache("device_l1", DEVICE_L1_SIZE, DEVICE_L1_TTL)
+        self._listener = None
     
     def is_available(self) -> bool:
         """Check if Redis is available"""
@@ -34,42 +144,166 @@ class CacheService:
             return True
         except RedisError:
             return False
+
+    def _migrate(self, key: str) -> Optional[Dict[str, Any]]:
+        """Convert a device stored as a JSON string into a hash"""
+        data = self.redis.get(key)
+        if not data:
+            return None
+        device = json.loads(data)
+        pipe = self.redis.pipeline()
+        pipe.delete(key)
+        pipe.hset(key, mapping=encode_fields(device))
+        pipe.expire(key, self.DEVICE_TTL)
+        self._index(pipe, device)
+        pipe.execute()
+        logger.debug(f"Migrated {key} to a hash")
+        return device
+
+    def _update(self, mac: str, data: Dict[str, Any], return_device: bool = False):
+        """
+        Write fields of a cached device in one round trip.
+        Returns None if the device is not cached, else the full device or True.
+        """
+        keys = [f"{self.DEVICE_KEY_PREFIX}{mac}", self.LAST_SEEN_INDEX, self.DISCONNECTED_SET]
+        last_seen = data.get("last_seen")
+        args = [self.DEVICE_TTL, 1 if return_device else 0, mac, "" if last_seen is None else last_seen]
+        for field, value in encode_fields(data).items():
+            args.extend((field, value))
+        try:
+            result = self._update_script(keys=keys, args=args)
+        except ResponseError as e:
+            if not is_wrong_type(e) or self._migrate(keys[0]) is None:
+                raise
+            result = self._update_script(keys=keys, args=args)
+        if not result:
+            return None
+        if return_device:
+            return decode_fields(dict(zip(result[::2], result[1::2])))
+        return True
     
     def get_device_by_mac(self, mac: str) -> Optional[Dict[str, Any]]:
         """Get device information from cache by MAC address"""
         try:
             key = f"{self.DEVICE_KEY_PREFIX}{mac}"
-            data = self.redis.get(key)
+            try:
+                data = self.redis.hgetall(key)
+            except ResponseError as e:
+                if not is_wrong_type(e):
+                    raise
+                return self._migrate(key)
             if data:
-                return json.loads(data)
+                return decode_fields(data)
             return None
         except Exception as e:
             logger.error(f"Failed to get device from cache: {e}")
             return None
+
+    def get_device_info(self, mac: str, fields: Iterable[str] = DEVICE_INFO_FIELDS) -> Optional[Dict[str, Any]]:
+        """
+        Get only the given fields of a cached device, None if the device is not cached.
+        The default fields are served from the L1 cache when possible; do not modify the result.
+        """
+        local = fields is DEVICE_INFO_FIELDS and self.local.enabled
+        if local:
+            info = self.local.get(mac)
+            if info is not None:
+                return info
+            version = self.local.version
+        info = self._read_fields(mac, fields)
+        if local and info is not None:
+            self.local.set(mac, info, version)
+        return info
+
+    def _read_fields(self, mac: str, fields: Iterable[str]) -> Optional[Dict[str, Any]]:
+        try:
+            fields = list(fields)
+            key = f"{self.DEVICE_KEY_PREFIX}{mac}"
+            try:
+                values = self.redis.hmget(key, fields)
+            except ResponseError as e:
+                if not is_wrong_type(e):
+                    raise
+                device = self._migrate(key)
+                return {f: device[f] for f in fields if f in device} if device else None
+            if all(value is None for value in values):
+                return None
+            return {f: json.loads(v) for f, v in zip(fields, values) if v is not None}
+        except Exception as e:
+            logger.error(f"Failed to get device info from cache: {e}")
+            return None
     
     def get_device_by_id(self, device_id: str) -> Optional[Dict[str, Any]]:
         """Get device information from cache by device ID"""
         try:
-            # This implementation depends on how you're storing devices
-            # We'll need to scan for a device with matching ID
-            all_devices = self.get_all_devices()
-            for device in all_devices:
-                if device.get("_id") == device_id:
-                    return device
-            return None
+            mac = self.redis.hget(self.DEVICE_ID_INDEX, device_id)
+            if not mac:
+                return None
+            device = self.get_device_by_mac(mac)
+            if not device or device.get("_id") != device_id:
+                # The device expired or its MAC changed, drop the stale entry
+                self.redis.hdel(self.DEVICE_ID_INDEX, device_id)
+                return None
+            return device
         except Exception as e:
             logger.error(f"Failed to get device by ID from cache: {e}")
             return None
+
+    def get_devices_by_tenant(self, tenant_id: str) -> List[Dict[str, Any]]:
+        """Get the cached devices of one tenant"""
+        try:
+            key = f"{self.TENANT_DEVICES_PREFIX}{tenant_id}"
+            macs = list(self.redis.smembers(key))
+            devices, missing = self._fetch([f"{self.DEVICE_KEY_PREFIX}{mac}" for mac in macs])
+            if missing:
+                self.redis.srem(key, *(k[len(self.DEVICE_KEY_PREFIX):] for k in missing))
+            return [d for d in devices if d.get("tenant_id") == tenant_id]
+        except Exception as e:
+            logger.error(f"Failed to get devices of tenant {tenant_id} from cache: {e}")
+            return []
+
+    def _fetch(self, keys: List[str]):
+        """Pipelined HGETALL of device keys. Returns (devices, keys that no longer exist)."""
+        devices = []
+        missing = []
+        pipe = self.redis.pipeline(transaction=False)
+        for key in keys:
+            pipe.hgetall(key)
+        for key, data in zip(keys, pipe.execute(raise_on_error=False)):
+            if is_wrong_type(data):
+                data = self._migrate(key)
+                if data:
+                    devices.append(data)
+            elif isinstance(data, Exception):
+                logger.error(f"Failed to read {key} from cache: {data}")
+            elif data:
+                devices.append(decode_fields(data))
+            else:
+                missing.append(key)
+        return devices, missing
+
+    def iter_devices(self, chunk_size: int = 500) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Walk all cached devices in chunks with an incremental SCAN, without blocking Redis
+        or loading the whole fleet at once. Each chunk is fetched in one pipeline.
+        """
+        keys = []
+        for key in self.redis.scan_iter(match=f"{self.DEVICE_KEY_PREFIX}*", count=chunk_size):
+            keys.append(key)
+            if len(keys) >= chunk_size:
+                devices, _ = self._fetch(keys)
+                yield devices
+                keys = []
+        if keys:
+            devices, _ = self._fetch(keys)
+            yield devices
     
     def get_all_devices(self) -> List[Dict[str, Any]]:
         """Get all devices from cache"""
         try:
             devices = []
-            keys = self.redis.keys(f"{self.DEVICE_KEY_PREFIX}*")
-            for key in keys:
-                data = self.redis.get(key)
-                if data:
-                    devices.append(json.loads(data))
+            for chunk in self.iter_devices():
+                devices.extend(chunk)
             return devices
         except Exception as e:
             logger.error(f"Failed to get all devices from cache: {e}")
@@ -83,58 +317,68 @@ class CacheService:
                 logger.error("Cannot update device without MAC address")
                 return
             
-            device = self.get_device_by_mac(mac)
-            if not device:
+            if not self._update(mac, data):
                 logger.warning(f"Device with MAC {mac} not found in cache, cannot update")
-                return
-            
-            # Update the device data
-            device.update(data)
-            key = f"{self.DEVICE_KEY_PREFIX}{mac}"
-            # Use custom serializer that handles datetime objects
-            self.redis.set(key, json_serialize(device), ex=self.DEVICE_TTL)
             
         except Exception as e:
             logger.error(f"Failed to update device sensor data: {e}")
 
     def update_device_state(self, mac: str, state: str) -> None:
         """Update device state in cache"""
+        self.transition_state(mac, state)
+
+    def transition_state(self, mac: str, state: str, touch: bool = True) -> Optional[Tuple[bool, Dict[str, Any]]]:
+        """
+        Atomically set the device state (and last_seen when `touch`) and publish the device;
+        without `touch` it is only published if the state changed.
+        Returns (whether the state changed, the updated device), or None if the device is
+        not cached. Concurrent writers agree on which one made the change.
+        """
         try:
-            device = self.get_device_by_mac(mac)
-            if not device:
+            keys = [f"{self.DEVICE_KEY_PREFIX}{mac}", self.LAST_SEEN_INDEX, self.DISCONNECTED_SET]
+            last_seen = json.dumps(get_real_time().timestamp()) if touch else ""
+            args = [self.DEVICE_TTL, json.dumps(state), last_seen, mac]
+            try:
+                result = self._transition_script(keys=keys, args=args)
+            except ResponseError as e:
+                if not is_wrong_type(e) or self._migrate(keys[0]) is None:
+                    raise
+                result = self._transition_script(keys=keys, args=args)
+            if not result:
                 logger.warning(f"Device with MAC {mac} not found in cache, cannot update state")
-                return
-            
-            # Update the state
-            device["state"] = state
-            device["last_seen"] = get_real_time().timestamp()
-            key = f"{self.DEVICE_KEY_PREFIX}{mac}"
-            # Use custom serializer that handles datetime objects
-            self.redis.set(key, json_serialize(device), ex=self.DEVICE_TTL)
+                return None
+            changed = result[0] == 1
+            device = decode_fields(dict(zip(result[2::2], result[3::2])))
             
             # Publish device state update event using synchronous method
             tenant_id = device.get("tenant_id")
-            if tenant_id:
+            if tenant_id and (touch or changed):
                 event_bus.publish_sync(f"device_status:{tenant_id}", device)
+            return changed, device
         except Exception as e:
             logger.error(f"Failed to update device state: {e}")
+            return None
     
     def update_last_seen(self, mac: str, last_seen: float) -> None:
         """Update the last seen timestamp of a device"""
         try:
-            device = self.get_device_by_mac(mac)
-            if not device:
+            if not self._update(mac, {"last_seen": last_seen}):
                 logger.warning(f"Device with MAC {mac} not found in cache, cannot update last seen")
-                return
-            
-            # Update the last seen timestamp
-            device["last_seen"] = last_seen
-            key = f"{self.DEVICE_KEY_PREFIX}{mac}"
-            # Use custom serializer that handles datetime objects
-            self.redis.set(key, json_serialize(device), ex=self.DEVICE_TTL)
         except Exception as e:
             logger.error(f"Failed to update last seen: {e}")
             
+    def touch_device(self, mac: str, last_seen: float) -> bool:
+        """
+        Refresh only the last seen timestamp of a known device (heartbeat path).
+        A disconnected device stays disconnected until its next status message.
+        Returns False if the device is not cached.
+        """
+        try:
+            return bool(self._update(mac, {"last_seen": last_seen}))
+        except Exception as e:
+            logger.error(f"Failed to touch device {mac}: {e}")
+            return False
+
     def get_devices_with_states(self) -> List[Dict[str, Any]]:
         """Get all devices with their states from cache"""
         return self.get_all_devices()
@@ -151,10 +395,29 @@ class CacheService:
             # Get device data as dictionary
             device_data = jsonable_encoder(device)
             
-            # Store by MAC address
+            # Store by MAC address, realtime fields (state, last_seen, sensor data) are kept
             if device.mac:
                 key = f"{self.DEVICE_KEY_PREFIX}{device.mac}"
-                self.redis.set(key, json_serialize(device_data), ex=self.DEVICE_TTL)
+                if self.redis.type(key) == "string":
+                    self._migrate(key)
+                device_id = device_data.get("_id")
+                previous_mac = self.redis.hget(self.DEVICE_ID_INDEX, device_id) if device_id else None
+                previous_mac = previous_mac or device.mac
+                previous_key = f"{self.DEVICE_KEY_PREFIX}{previous_mac}"
+                previous_tenant = (self.get_device_info(previous_mac, ["tenant_id"]) or {}).get("tenant_id")
+
+                pipe = self.redis.pipeline()
+                if previous_mac != device.mac:
+                    # The MAC changed, the device no longer lives under the old key
+                    pipe.delete(previous_key)
+                    self._unindex_idle(pipe, previous_mac)
+                if previous_tenant and (previous_mac, previous_tenant) != (device.mac, device.tenant_id):
+                    pipe.srem(f"{self.TENANT_DEVICES_PREFIX}{previous_tenant}", previous_mac)
+                pipe.hset(key, mapping=encode_fields(device_data))
+                pipe.expire(key, self.DEVICE_TTL)
+                self._index(pipe, device_data)
+                pipe.execute()
+                self.invalidate(device.mac, previous_mac)
                 logger.debug(f"Device {device.mac} cached successfully")
             else:
                 logger.warning(f"Cannot cache device without MAC address: {device.id}")
@@ -171,17 +434,125 @@ class CacheService:
         try:
             if device.mac:
                 key = f"{self.DEVICE_KEY_PREFIX}{device.mac}"
-                self.redis.delete(key)
+                tenant_id = device.tenant_id or (self.get_device_info(device.mac, ["tenant_id"]) or {}).get("tenant_id")
+                pipe = self.redis.pipeline()
+                pipe.delete(key)
+                if device.id:
+                    pipe.hdel(self.DEVICE_ID_INDEX, str(device.id))
+                if tenant_id:
+                    pipe.srem(f"{self.TENANT_DEVICES_PREFIX}{tenant_id}", device.mac)
+                self._unindex_idle(pipe, device.mac)
+                pipe.execute()
+                self.invalidate(device.mac)
                 logger.debug(f"Device {device.mac} removed from cache")
             else:
                 logger.warning(f"Cannot remove device without MAC address: {device.id}")
         except Exception as e:
             logger.error(f"Failed to remove device from cache: {e}")
 
+    def _index(self, pipe, device_data: Dict[str, Any]) -> None:
+        """Queue the secondary index entries of a device on a pipeline"""
+        mac = device_data.get("mac")
+        if device_data.get("_id"):
+            pipe.hset(self.DEVICE_ID_INDEX, device_data["_id"], mac)
+        if device_data.get("tenant_id"):
+            pipe.sadd(f"{self.TENANT_DEVICES_PREFIX}{device_data['tenant_id']}", mac)
+
+    def _unindex_idle(self, pipe, mac: str) -> None:
+        """Queue the removal of a device from the idle tracking on a pipeline"""
+        pipe.zrem(self.LAST_SEEN_INDEX, mac)
+        pipe.srem(self.DISCONNECTED_SET, mac)
+
+    def claim_idle_devices(self, cutoff: float, batch_size: int = 500) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Mark devices last seen at or before `cutoff` as disconnected and yield them in
+        batches. Only devices that fell behind since the previous call are read, each
+        idle period is claimed by exactly one caller, and a device is tracked again as
+        soon as it reports.
+        """
+        while True:
+            result = self._claim_script(
+                keys=[self.LAST_SEEN_INDEX, self.DISCONNECTED_SET],
+                args=[cutoff, batch_size, json.dumps(DeviceState.DISCONNECTED.value), self.DEVICE_KEY_PREFIX],
+            )
+            taken, macs = result[0], result[1:]
+            if macs:
+                devices, _ = self._fetch([f"{self.DEVICE_KEY_PREFIX}{mac}" for mac in macs])
+                yield devices
+            if taken < batch_size:
+                break
+
+    def warm(self, devices: Iterable[Device], batch_size: int = 500, restart: bool = False) -> Dict[str, int]:
+        """
+        Bring the cache in line with the given devices without clearing it.
+        Only new devices and changed configuration fields are written, in pipelined
+        batches; state, last_seen and sensor values of cached devices are kept.
+        With `restart`, connected devices get a full IDLE_TIME from now in the last seen
+        index, so downtime longer than IDLE_TIME does not disconnect the whole fleet.
+        Returns counts of added, updated and unchanged devices.
+        """
+        stats = {"added": 0, "updated": 0, "unchanged": 0}
+        batch = []
+        for device in devices:
+            if not device.mac:
+                continue
+            batch.append(device)
+            if len(batch) >= batch_size:
+                self._warm_batch(batch, stats, restart)
+                batch = []
+        if batch:
+            self._warm_batch(batch, stats, restart)
+        if stats["added"] or stats["updated"]:
+            self.invalidate()
+        return stats
+
+    def _warm_batch(self, devices: List[Device], stats: Dict[str, int], restart: bool = False) -> None:
+        keys = [f"{self.DEVICE_KEY_PREFIX}{device.mac}" for device in devices]
+        pipe = self.redis.pipeline(transaction=False)
+        for key in keys:
+            pipe.hmget(key, WARM_FIELDS + IDLE_FIELDS)
+        cached = pipe.execute(raise_on_error=False)
+        disconnected = json.dumps(DeviceState.DISCONNECTED.value)
+
+        current_time = get_real_time().timestamp()
+        pipe = self.redis.pipeline(transaction=False)
+        for device, key, values in zip(devices, keys, cached):
+            if is_wrong_type(values):
+                self._migrate(key)
+                values = self.redis.hmget(key, WARM_FIELDS + IDLE_FIELDS)
+            values, (state, last_seen) = values[:len(WARM_FIELDS)], values[len(WARM_FIELDS):]
+            device_data = jsonable_encoder(device)
+            if all(value is None for value in values):
+                # New device, set default values for realtime fields
+                device_data["last_seen"] = current_time
+                device_data["state"] = ""
+                pipe.hset(key, mapping=encode_fields(device_data))
+                pipe.zadd(self.LAST_SEEN_INDEX, {device.mac: current_time})
+                stats["added"] += 1
+            else:
+                if state != disconnected:
+                    if restart:
+                        # Messages were not received while down, the stored last_seen stays as it is
+                        pipe.zadd(self.LAST_SEEN_INDEX, {device.mac: current_time})
+                    elif last_seen is not None:
+                        # Devices cached before the last seen index existed
+                        pipe.zadd(self.LAST_SEEN_INDEX, {device.mac: float(last_seen)}, nx=True)
+                encoded = encode_fields({f: device_data.get(f) for f in WARM_FIELDS})
+                changed = {f: v for (f, v), old in zip(encoded.items(), values) if v != old}
+                if changed:
+                    pipe.hset(key, mapping=changed)
+                    stats["updated"] += 1
+                else:
+                    stats["unchanged"] += 1
+            pipe.expire(key, self.DEVICE_TTL)
+            self._index(pipe, device_data)
+        pipe.execute()
+
     def cache_device(self, devices: List[Device]) -> None:
         if not self.is_available():
             logger.error("Redis is not available, cannot initialize cache")
             return
+        pipe = self.redis.pipeline(transaction=False)
         for device in devices:
             device_data = jsonable_encoder(device)
             
@@ -193,7 +564,14 @@ class CacheService:
             # Cache the device data
             if device.mac:
                 key = f"{self.DEVICE_KEY_PREFIX}{device.mac}"
-                self.redis.set(key, json_serialize(device_data), ex=self.DEVICE_TTL)
+                pipe.delete(key)
+                pipe.hset(key, mapping=encode_fields(device_data))
+                pipe.expire(key, self.DEVICE_TTL)
+                self._index(pipe, device_data)
+                pipe.srem(self.DISCONNECTED_SET, device.mac)
+                pipe.zadd(self.LAST_SEEN_INDEX, {device.mac: current_time})
+        pipe.execute()
+        self.invalidate()
         
         logger.info(f"Successfully cached {len(devices)} devices")
         
@@ -201,9 +579,46 @@ class CacheService:
         """Clear all cache data"""
         try:
             self.redis.flushdb()
+            self.invalidate()
             logger.info("Cache cleared successfully")
         except Exception as e:
             logger.error(f"Failed to clear cache: {e}")
 
+    def invalidate(self, *macs: str) -> None:
+        """Drop devices (all when no MAC is given) from the L1 cache of every process"""
+        try:
+            targets = set(macs) if macs else {"*"}
+            for mac in targets:
+                self._drop_local(mac)
+                self.redis.publish(self.INVALIDATE_CHANNEL, mac)
+        except Exception as e:
+            logger.error(f"Failed to publish device cache invalidation: {e}")
+
+    def _drop_local(self, mac: str) -> None:
+        self.local.invalidate(None if mac == "*" else mac)
+
+    def _handle_invalidation(self, message) -> None:
+        self._drop_local(message["data"])
+
+    def _handle_listener_error(self, e, pubsub, thread) -> None:
+        # Invalidations may have been missed while disconnected
+        logger.error(f"Device cache invalidation listener error: {e}")
+        self.local.invalidate()
+        time.sleep(1)
+
+    def start_invalidation_listener(self) -> None:
+        """Listen for invalidations from other processes in a background thread"""
+        if self._listener or not self.local.enabled:
+            return
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{self.INVALIDATE_CHANNEL: self._handle_invalidation})
+        self._listener = pubsub.run_in_thread(sleep_time=1.0, daemon=True, exception_handler=self._handle_listener_error)
+        logger.info(f"Device L1 cache enabled ({self.local.maxsize} entries, {self.local.ttl}s TTL)")
+
+    def stop_invalidation_listener(self) -> None:
+        if self._listener:
+            self._listener.stop()
+            self._listener = None
+
 # Create a singleton instance
 cache_service = CacheService()
\ No newline at end of file
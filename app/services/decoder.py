@@ -0,0 +1,126 @@
+"""
+## Status Decoder
+Hot-path decoding of device status messages.
+The raw MQTT payload bytes are parsed and validated in a single pass by a schema
+compiled once at import time (pydantic-core), and turned into one `SensorRecord`.
+
+Supported payload formats:
+- `unit/<mac>/status`: one JSON object per reading
+- `unit/<mac>/status/bin`: one packed reading (STATUS_STRUCT)
+- `gateway/<id>/batch`: JSON array of readings, each carrying its `mac`
+- `gateway/<id>/batch/bin`: concatenated 6-byte MAC + packed reading records
+"""
+import struct
+from datetime import datetime, timedelta, timezone
+from typing import List, NotRequired, Optional, Tuple, TypedDict
+from pydantic import TypeAdapter
+from models.report import SensorRecord
+
+# Devices report their local (UTC+7) wall clock as an epoch value
+DEVICE_TZ = timezone(timedelta(hours=7))
+
+class StatusPayload(TypedDict):
+    time: int
+    voltage: float
+    current: float
+    power: float
+    total_energy: float
+    toggle: bool
+    gps_lat: NotRequired[float]
+    gps_log: NotRequired[float]
+
+class BatchReading(StatusPayload):
+    mac: str
+
+_status_adapter = TypeAdapter(StatusPayload)
+_batch_adapter = TypeAdapter(List[BatchReading])
+
+# Little-endian: time (u32), voltage, current, power, total_energy (f32), toggle (u8), gps_lat, gps_log (f32)
+STATUS_STRUCT = struct.Struct("<IffffBff")
+# Batched binary records are prefixed with the raw 6-byte MAC
+BATCH_RECORD_STRUCT = struct.Struct("<6s" + STATUS_STRUCT.format[1:])
+
+UNIT_TOPIC_TYPES = ("status", "alive", "status/bin")
+GATEWAY_TOPIC_TYPES = ("batch", "batch/bin")
+
+def parse_topic(topic: str) -> Optional[Tuple[str, str]]:
+    """
+    Split `unit/<mac>/<type>` or `gateway/<id>/<type>` into (mac or gateway id, type).
+    Returns None for any other topic.
+    """
+    parts = topic.split("/", 2)
+    if len(parts) != 3 or not parts[1]:
+        return None
+    root, key, _type = parts
+    if root == "unit" and _type in UNIT_TOPIC_TYPES:
+        return key, _type
+    if root == "gateway" and _type in GATEWAY_TOPIC_TYPES:
+        return key, _type
+    return None
+
+def decode_status(payload: bytes) -> StatusPayload:
+    """Parse and validate a status payload directly from bytes"""
+    return _status_adapter.validate_json(payload)
+
+def _unpack_status(values: tuple) -> StatusPayload:
+    time, voltage, current, power, total_energy, toggle, gps_lat, gps_log = values
+    # Round away float32 noise
+    return {
+        "time": time,
+        "voltage": round(voltage, 3),
+        "current": round(current, 3),
+        "power": round(power, 3),
+        "total_energy": round(total_energy, 3),
+        "toggle": bool(toggle),
+        "gps_lat": round(gps_lat, 6),
+        "gps_log": round(gps_log, 6),
+    }
+
+def decode_status_binary(payload: bytes) -> StatusPayload:
+    """Decode a packed status reading"""
+    if len(payload) != STATUS_STRUCT.size:
+        raise ValueError(f"Binary status must be {STATUS_STRUCT.size} bytes, got {len(payload)}")
+    return _unpack_status(STATUS_STRUCT.unpack(payload))
+
+def decode_batch(payload: bytes) -> List[Tuple[str, StatusPayload]]:
+    """Parse and validate a JSON array of readings into (mac, status) pairs"""
+    return [(reading["mac"], reading) for reading in _batch_adapter.validate_json(payload)]
+
+def decode_batch_binary(payload: bytes) -> List[Tuple[str, StatusPayload]]:
+    """Decode concatenated MAC-prefixed packed readings into (mac, status) pairs"""
+    if len(payload) % BATCH_RECORD_STRUCT.size:
+        raise ValueError(f"Binary batch length {len(payload)} is not a multiple of {BATCH_RECORD_STRUCT.size}")
+    return [
+        (values[0].hex(), _unpack_status(values[1:]))
+        for values in BATCH_RECORD_STRUCT.iter_unpack(payload)
+    ]
+
+def device_time(timestamp: int | None) -> datetime:
+    """Convert the device epoch to an aware datetime, same result as mqtt.get_tz_datetime"""
+    if not timestamp:
+        return datetime.now(DEVICE_TZ)
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=DEVICE_TZ)
+
+def build_record(mac: str, status: StatusPayload, device: dict) -> SensorRecord:
+    """Combine a decoded status with the cached device info"""
+    return SensorRecord(
+        mac=mac,
+        device_id=str(device.get("_id")),
+        device_name=device.get("name"),
+        tenant_id=device.get("tenant_id"),
+        timestamp=device_time(status["time"]),
+        voltage=status["voltage"],
+        current=status["current"],
+        power=status["power"],
+        power_factor=0.0,
+        total_energy=status["total_energy"],
+        energy_meter=status["total_energy"],
+        toggle=status["toggle"],
+        auto=device.get("auto", False),
+        hour_on=device.get("hour_on", 0),
+        hour_off=device.get("hour_off", 0),
+        minute_on=device.get("minute_on", 0),
+        minute_off=device.get("minute_off", 0),
+        latitude=status.get("gps_lat", 0),
+        longitude=status.get("gps_log", 0),
+    )
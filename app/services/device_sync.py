@@ -0,0 +1,152 @@
+"""
+## Device Sync
+Keeps the device cache in line with `scada_db.devices` by tailing a MongoDB change
+stream, so edits made outside the API (scripts, migrations, other instances) reach
+Redis and the in-process caches without a restart.
+
+Changes are applied in batches: configuration updates go through the pipelined
+warmup diff, MAC/tenant moves and deletes through the regular cache calls. The
+resume token is kept in Redis, so a restart continues where the last run stopped.
+
+Change streams need a replica set; a single node is enough:
+
+    mongod --replSet rs0   then once:   rs.initiate()
+"""
+import threading
+import time
+from typing import List
+from bson import json_util
+from pymongo.errors import OperationFailure, PyMongoError
+from database.mongo import device_collection
+from database.redis import get_redis_connection
+from models.device import Device
+from services.cache_service import cache_service
+from utils.config import DEVICE_SYNC_BATCH
+from utils.logging import logger
+from utils.metrics import metrics
+
+RESUME_TOKEN_KEY = "device_sync:resume_token"
+# The resume token is older than the oplog window
+CHANGE_STREAM_HISTORY_LOST = 286
+
+class DeviceSync:
+    def __init__(self, batch_size: int = DEVICE_SYNC_BATCH, max_await_ms: int = 1000):
+        self.batch_size = batch_size
+        self.max_await_ms = max_await_ms
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        # Time the stream has been applied up to, in seconds
+        self._position = None
+
+        self._applied = metrics.counter("device_sync.applied")
+        self._batch = metrics.histogram("device_sync.batch_size")
+        metrics.gauge("device_sync.lag_s", self.lag)
+
+    def lag(self) -> float:
+        """
+        Seconds the cache is behind the devices collection: the age of the last applied
+        change while events are pending, close to 0 once the stream is drained. Keeps
+        growing while the stream is down.
+        """
+        if self._position is None:
+            return 0.0
+        return max(0.0, time.time() - self._position)
+
+    def _load_token(self):
+        data = get_redis_connection().get(RESUME_TOKEN_KEY)
+        return json_util.loads(data) if data else None
+
+    def _save_token(self, token) -> None:
+        if token:
+            get_redis_connection().set(RESUME_TOKEN_KEY, json_util.dumps(token))
+
+    def apply(self, changes: List[dict]) -> None:
+        """Apply a batch of change events to the cache, in order"""
+        updated = []
+        for change in changes:
+            operation = change["operationType"]
+            if operation == "delete":
+                if updated:
+                    cache_service.warm(updated)
+                    updated = []
+                device_id = str(change["documentKey"]["_id"])
+                cached = cache_service.get_device_by_id(device_id)
+                if cached:
+                    cache_service.delete_device(Device(**cached))
+            elif operation in ("insert", "update", "replace"):
+                document = change.get("fullDocument")
+                if not document:
+                    # Deleted again before the lookup, the delete event follows
+                    continue
+                device = Device(**document)
+                fields = change.get("updateDescription", {}).get("updatedFields", {})
+                if operation != "update" or "mac" in fields or "tenant_id" in fields:
+                    # Moves between keys and index entries are handled per device
+                    if updated:
+                        cache_service.warm(updated)
+                        updated = []
+                    cache_service.config_settings(device)
+                else:
+                    updated.append(device)
+        if updated:
+            cache_service.warm(updated)
+        self._applied.inc(len(changes))
+        self._batch.observe(len(changes))
+
+    def _tail(self) -> None:
+        token = self._load_token()
+        with device_collection.watch(full_document="updateLookup", resume_after=token,
+                                     max_await_time_ms=self.max_await_ms) as stream:
+            logger.info(f"Device sync tailing change stream ({'resumed' if token else 'from now'})")
+            while not self._stop.is_set():
+                batch = []
+                change = stream.try_next()
+                while change is not None:
+                    batch.append(change)
+                    if len(batch) >= self.batch_size:
+                        break
+                    change = stream.try_next()
+                # Nothing left to read: once applied, the cache is current as of this moment
+                drained_at = time.time() if change is None else None
+                if batch:
+                    self.apply(batch)
+                self._position = drained_at or batch[-1]["clusterTime"].time
+                # Advances even without events, so the token never falls out of the oplog
+                self._save_token(stream.resume_token)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._tail()
+            except OperationFailure as e:
+                if e.code == CHANGE_STREAM_HISTORY_LOST:
+                    logger.warning("Device sync resume token expired, rewarming the cache")
+                    get_redis_connection().delete(RESUME_TOKEN_KEY)
+                    cache_service.warm(Device(**device) for device in device_collection.find().batch_size(1000))
+                else:
+                    logger.error(f"Device sync change stream failed: {e}")
+                    self._stop.wait(5)
+            except PyMongoError as e:
+                logger.error(f"Device sync change stream failed: {e}")
+                self._stop.wait(5)
+            except Exception as e:
+                logger.error(f"Error in device sync loop: {e}")
+                self._stop.wait(5)
+
+    def start(self) -> None:
+        """Start tailing the devices collection"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="device-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.max_await_ms / 1000 * 2 + 1)
+            self._thread = None
+            logger.info("Device sync stopped")
+
+# Create a singleton instance
+device_sync = DeviceSync()
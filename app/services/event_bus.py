@@ -3,11 +3,12 @@ Event Bus Service using Redis Pub/Sub for real-time communication
 """
 import json
 import asyncio
-from typing import Any, Callable, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from redis.asyncio import Redis
 from redis.exceptions import ConnectionError, TimeoutError
 from database.redis import get_async_redis_connection, get_redis_connection
 from utils.logging import logger
+from utils.metrics import metrics
 from utils.serializers import json_serialize
 
 class EventBus:
@@ -27,14 +28,29 @@ class EventBus:
         Synchronous version of publish that can be called from non-async code
         """
         try:
-            # Use the synchronous Redis connection
-            redis = get_redis_connection()
-            # Use custom serializer that handles datetime objects
-            serialized_message = json_serialize(message) if not isinstance(message, str) else message
-            redis.publish(channel, serialized_message)
+            with metrics.timer("ingest.stage.event_publish", channel.partition(":")[2]):
+                # Use the synchronous Redis connection
+                redis = get_redis_connection()
+                # Use custom serializer that handles datetime objects
+                serialized_message = json_serialize(message) if not isinstance(message, str) else message
+                redis.publish(channel, serialized_message)
         except Exception as e:
             logger.error(f"Failed to publish to channel {channel} (sync): {e}")
     
+    def publish_many_sync(self, messages: List[Tuple[str, Any]]) -> None:
+        """
+        Publish (channel, message) pairs in one pipelined round trip, from non-async code
+        """
+        if not messages:
+            return
+        try:
+            pipe = get_redis_connection().pipeline(transaction=False)
+            for channel, message in messages:
+                pipe.publish(channel, json_serialize(message) if not isinstance(message, str) else message)
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to publish {len(messages)} messages (sync): {e}")
+    
     async def subscribe(self, pattern: str, callback: Callable) -> None:
         """
         Subscribe to a channel pattern with a callback
@@ -100,9 +116,8 @@ class EventBus:
             await self._pubsub.close()
             self._pubsub = None
         
-        if self._redis:
-            await self._redis.close()
-            self._redis = None
+        # The client belongs to the shared pool, closed by database.redis.close_redis
+        self._redis = None
 
 # Create a singleton instance
 event_bus = EventBus()
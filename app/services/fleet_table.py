@@ -0,0 +1,172 @@
+"""
+## Fleet Table
+In-process columnar table of devices, one NumPy array per field and one row per device
+(34 bytes), used to evaluate the schedule status of many devices in one vectorized pass
+instead of one Python call per reading.
+
+Gateway batches are written and evaluated this way, see services.mqtt.Client.handle_batch;
+single status messages keep the scalar path, which is cheaper for one reading.
+`evaluate()` and `idle()` run over the whole table, a 100k-device pass takes a few
+milliseconds. The table only holds devices whose batches reach this process; the
+cluster-wide idle check stays on the Redis last seen index (services.cache_service).
+
+The logic mirrors services.status_manager._schedule_status.
+"""
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from models.alert import AlertSeverity, DeviceState
+from models.report import SensorRecord
+from utils import local_seconds
+from utils.config import POWER_MIN_THRESHOLD
+from utils.metrics import metrics
+
+STATES = list(DeviceState)
+SEVERITIES = list(AlertSeverity)
+_STATE = {state: code for code, state in enumerate(STATES)}
+_SEVERITY = {severity: code for code, severity in enumerate(SEVERITIES)}
+
+COLUMNS = {
+    "power": np.float32,
+    "voltage": np.float32,
+    "toggle": np.bool_,
+    "auto": np.bool_,
+    # Schedule as seconds of the local day
+    "on_s": np.int32,
+    "off_s": np.int32,
+    "last_seen": np.float64,
+}
+STATUS_FIELDS = ("power", "voltage", "toggle", "auto", "on_s", "off_s")
+
+def in_working_hours(now_s: float, on_s: np.ndarray, off_s: np.ndarray) -> np.ndarray:
+    """Vectorized services.status_manager.in_working_hours"""
+    overnight = off_s < on_s
+    return np.where(overnight, (now_s >= on_s) | (now_s <= off_s), (on_s <= now_s) & (now_s <= off_s))
+
+def _fields(records: Sequence[SensorRecord]) -> Dict[str, np.ndarray]:
+    """Column values of the records, one array per column"""
+    return {
+        "power": np.fromiter((record.power for record in records), dtype=np.float32, count=len(records)),
+        "voltage": np.fromiter((record.voltage for record in records), dtype=np.float32, count=len(records)),
+        "toggle": np.fromiter((record.toggle for record in records), dtype=np.bool_, count=len(records)),
+        "auto": np.fromiter((record.auto for record in records), dtype=np.bool_, count=len(records)),
+        "on_s": np.fromiter((record.hour_on * 3600 + record.minute_on * 60 for record in records), dtype=np.int32, count=len(records)),
+        "off_s": np.fromiter((record.hour_off * 3600 + record.minute_off * 60 for record in records), dtype=np.int32, count=len(records)),
+        "last_seen": np.fromiter((record.timestamp.timestamp() for record in records), dtype=np.float64, count=len(records)),
+    }
+
+def schedule_status(fields: Dict[str, np.ndarray], now_s: float) -> Tuple[np.ndarray, np.ndarray]:
+    """State and severity codes of column arrays, see FleetTable.evaluate"""
+    power, voltage, toggle, auto, on_s, off_s = (fields[name] for name in STATUS_FIELDS)
+    working = power >= POWER_MIN_THRESHOLD
+    in_hours = in_working_hours(now_s, on_s, off_s)
+    powered = voltage > 0
+    on_as_expected = powered & working & toggle
+    off_as_expected = powered & ~working & ~toggle
+    conditions = [
+        ~powered,
+        on_as_expected & (~auto | in_hours),
+        on_as_expected,
+        off_as_expected & (~auto | ~in_hours),
+        off_as_expected,
+        powered & working & ~toggle,
+    ]
+    states = np.select(conditions, [
+        _STATE[DeviceState.POWER_LOST],
+        _STATE[DeviceState.WORKING],
+        _STATE[DeviceState.ON_OUT_OF_HOUR],
+        _STATE[DeviceState.OFF],
+        _STATE[DeviceState.OFF_OUT_OF_HOUR],
+        _STATE[DeviceState.WORKING],
+    ], default=_STATE[DeviceState.WORKING]).astype(np.int8)
+    severities = np.select(conditions, [
+        _SEVERITY[AlertSeverity.CRITICAL],
+        _SEVERITY[AlertSeverity.NORMAL],
+        _SEVERITY[AlertSeverity.WARNING],
+        _SEVERITY[AlertSeverity.NORMAL],
+        _SEVERITY[AlertSeverity.WARNING],
+        _SEVERITY[AlertSeverity.CRITICAL],
+    ], default=_SEVERITY[AlertSeverity.NORMAL]).astype(np.int8)
+    return states, severities
+
+class FleetTable:
+    def __init__(self, capacity: int = 1024):
+        self._rows: Dict[str, int] = {}
+        self._macs: List[str] = []
+        self._size = 0
+        self._columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in COLUMNS.items()}
+        self._lock = threading.Lock()
+
+        metrics.gauge("fleet_table.devices", lambda: self._size)
+        metrics.gauge("fleet_table.bytes", self.nbytes)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def nbytes(self) -> int:
+        """Bytes of the column arrays, excluding the MAC index"""
+        return sum(column.nbytes for column in self._columns.values())
+
+    def _grow(self, needed: int) -> None:
+        capacity = len(self._columns["power"])
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name, column in self._columns.items():
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            self._columns[name] = grown
+
+    def _row(self, mac: str) -> int:
+        row = self._rows.get(mac)
+        if row is None:
+            self._grow(self._size + 1)
+            row = self._rows[mac] = self._size
+            self._macs.append(mac)
+            self._size += 1
+        return row
+
+    def upsert(self, records: Sequence[SensorRecord]) -> np.ndarray:
+        """Write the readings of the records, returns their rows"""
+        fields = _fields(records)
+        with self._lock:
+            rows = np.fromiter((self._row(record.mac) for record in records), dtype=np.int64, count=len(records))
+            for name, values in fields.items():
+                self._columns[name][rows] = values
+        return rows
+
+    def evaluate(self, rows: Optional[np.ndarray] = None, now_s: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        State and severity codes (indexes of STATES and SEVERITIES) of the given rows,
+        or of every device, in one vectorized pass.
+        """
+        with self._lock:
+            selection = slice(0, self._size) if rows is None else rows
+            fields = {name: self._columns[name][selection] for name in STATUS_FIELDS}
+        return schedule_status(fields, local_seconds() if now_s is None else now_s)
+
+    def evaluate_records(self, records: Sequence[SensorRecord]) -> List[Tuple[DeviceState, AlertSeverity]]:
+        """
+        Schedule status of each reading of a micro-batch, then keep the newest reading
+        of each device in the table. A batch may carry several readings of one device.
+        """
+        if not records:
+            return []
+        states, severities = schedule_status(_fields(records), local_seconds())
+        newest: Dict[str, SensorRecord] = {}
+        for record in records:
+            current = newest.get(record.mac)
+            if current is None or record.timestamp >= current.timestamp:
+                newest[record.mac] = record
+        self.upsert(list(newest.values()))
+        return [(STATES[state], SEVERITIES[severity]) for state, severity in zip(states.tolist(), severities.tolist())]
+
+    def idle(self, cutoff: float) -> List[str]:
+        """MACs of the devices last seen before `cutoff`"""
+        with self._lock:
+            idle_rows = np.flatnonzero(self._columns["last_seen"][:self._size] < cutoff)
+            return [self._macs[row] for row in idle_rows.tolist()]
+
+# Create a singleton instance
+fleet_table = FleetTable()
@@ -0,0 +1,205 @@
+"""
+## Ingest Pipeline
+Decouples the MQTT network thread from message processing.
+`on_message` only enqueues raw `(topic, payload, recv_ts)` tuples; worker threads
+run the processing stages (decode -> preprocess -> persist -> alert -> publish).
+
+Messages are partitioned by the device MAC (or gateway id) in the topic, so the
+status, binary status, alive and batch messages of a device are handled by the same
+worker and per-device ordering is preserved.
+
+With a persistent MQTT session, every QoS 1 message travels with a `Delivery`.
+Its PUBACK is held back until processing is done and the readings it carried are
+durable (written to MongoDB or the spool), so a restart never loses accepted data.
+"""
+import queue
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Callable, List, Optional
+from utils.config import INGEST_WORKERS, INGEST_QUEUE_SIZE, INGEST_OVERFLOW_POLICY, INGEST_PUT_TIMEOUT
+from utils.logging import logger
+from utils.metrics import metrics
+
+OVERFLOW_POLICIES = ("block", "drop_newest", "drop_oldest")
+
+_STOP = object()
+
+class Delivery:
+    """A received QoS 1 message, acknowledged once every hold on it is released"""
+    __slots__ = ("mid", "qos", "_holds", "_tracker")
+
+    def __init__(self, tracker: "AckTracker", mid: int, qos: int):
+        self.mid = mid
+        self.qos = qos
+        # Released by the pipeline when processing of the message is done
+        self._holds = 1
+        self._tracker = tracker
+
+    def hold(self) -> "Delivery":
+        """Delay the acknowledgement until a matching release()"""
+        self._tracker._hold(self)
+        return self
+
+    def release(self) -> None:
+        self._tracker._release(self)
+
+class AckTracker:
+    """
+    Sends acknowledgements in the order messages were received, as MQTT requires.
+    A message is acknowledged once it and every message received before it are released.
+    """
+    def __init__(self, ack: Callable[[int, int], object]):
+        self._ack = ack
+        self._order: deque[Delivery] = deque()
+        self._lock = threading.Lock()
+
+        self._acked = metrics.counter("ingest.acked")
+        metrics.gauge("ingest.unacked", self.pending)
+
+    def track(self, mid: int, qos: int) -> Delivery:
+        delivery = Delivery(self, mid, qos)
+        with self._lock:
+            self._order.append(delivery)
+        return delivery
+
+    def pending(self) -> int:
+        """Number of received messages not acknowledged yet"""
+        return len(self._order)
+
+    def reset(self) -> int:
+        """
+        Forget unacknowledged messages after a reconnect; their packet ids belong to the old
+        connection and the broker redelivers them. Returns how many were forgotten.
+        """
+        with self._lock:
+            forgotten = len(self._order)
+            self._order.clear()
+        return forgotten
+
+    def _hold(self, delivery: Delivery) -> None:
+        with self._lock:
+            delivery._holds += 1
+
+    def _release(self, delivery: Delivery) -> None:
+        acked = 0
+        with self._lock:
+            delivery._holds -= 1
+            while self._order and self._order[0]._holds <= 0:
+                head = self._order.popleft()
+                self._ack(head.mid, head.qos)
+                acked += 1
+        if acked:
+            self._acked.inc(acked)
+
+def partition_key(topic: str) -> int:
+    """Hash of the MAC or gateway id of `unit/<mac>/...` and `gateway/<id>/...` topics"""
+    parts = topic.split("/", 2)
+    return zlib.crc32((parts[1] if len(parts) > 1 else topic).encode())
+
+class IngestPipeline:
+    def __init__(self, handler: Callable[[str, bytes, float, Optional[Delivery]], None], workers: int = INGEST_WORKERS,
+                 queue_size: int = INGEST_QUEUE_SIZE, overflow_policy: str = INGEST_OVERFLOW_POLICY,
+                 put_timeout: float = INGEST_PUT_TIMEOUT):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow_policy}, expected one of {OVERFLOW_POLICIES}")
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.overflow_policy = overflow_policy
+        self.put_timeout = put_timeout
+        self._queues: List[queue.Queue] = [queue.Queue(maxsize=queue_size) for _ in range(self.workers)]
+        self._threads: List[threading.Thread] = []
+        self._accepting = False
+
+        self._enqueued = metrics.counter("ingest.enqueued")
+        self._dropped = metrics.counter("ingest.dropped")
+        self._processed = metrics.counter("ingest.processed")
+        self._failed = metrics.counter("ingest.failed")
+        self._queue_latency = metrics.histogram("ingest.queue_latency_ms")
+        metrics.gauge("ingest.queue_depth", self.depth)
+
+    def depth(self) -> int:
+        """Total number of messages waiting in all worker queues"""
+        return sum(q.qsize() for q in self._queues)
+
+    def submit(self, topic: str, payload: bytes, delivery: Delivery | None = None) -> bool:
+        """
+        Enqueue a raw message. Called from the MQTT network thread, so it must stay cheap.
+        Returns False if the message was dropped.
+
+        Dropped messages are acknowledged, so they do not pin the broker's in-flight window.
+        Messages arriving after stop() are not: the broker redelivers them after the restart.
+        """
+        if not self._accepting:
+            self._dropped.inc()
+            return False
+        item = (topic, payload, time.time(), delivery)
+        q = self._queues[partition_key(topic) % self.workers]
+        try:
+            if self.overflow_policy == "block":
+                # Backpressure: stall the network thread (and so the broker) for a bounded time
+                q.put(item, timeout=self.put_timeout)
+            elif self.overflow_policy == "drop_newest":
+                q.put_nowait(item)
+            else:
+                while True:
+                    try:
+                        q.put_nowait(item)
+                        break
+                    except queue.Full:
+                        try:
+                            oldest = q.get_nowait()
+                            self._dropped.inc()
+                            if oldest is not _STOP and oldest[3]:
+                                oldest[3].release()
+                        except queue.Empty:
+                            pass
+        except queue.Full:
+            self._dropped.inc()
+            logger.warning(f"Ingest queue full, dropped message on {topic}")
+            if delivery:
+                delivery.release()
+            return False
+        self._enqueued.inc()
+        return True
+
+    def _run(self, q: queue.Queue) -> None:
+        while True:
+            item = q.get()
+            if item is _STOP:
+                break
+            topic, payload, recv_ts, delivery = item
+            self._queue_latency.observe((time.time() - recv_ts) * 1000)
+            try:
+                self.handler(topic, payload, recv_ts, delivery)
+                self._processed.inc()
+            except Exception as e:
+                self._failed.inc()
+                logger.error(f"Error processing message on {topic}: {e}")
+            finally:
+                # Poison and failed messages are acknowledged too, redelivery would fail the same way
+                if delivery:
+                    delivery.release()
+
+    def start(self) -> None:
+        """Start the worker threads"""
+        if self._threads:
+            return
+        for i, q in enumerate(self._queues):
+            thread = threading.Thread(target=self._run, args=(q,), name=f"ingest-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        self._accepting = True
+        logger.info(f"Ingest pipeline started with {self.workers} workers ({self.overflow_policy})")
+
+    def stop(self, timeout: float = 10) -> None:
+        """Stop accepting messages, drain the queues and stop the workers"""
+        self._accepting = False
+        for q in self._queues:
+            q.put(_STOP)
+        deadline = time.time() + timeout
+        for thread in self._threads:
+            thread.join(timeout=max(0, deadline - time.time()))
+        self._threads = []
+        logger.info(f"Ingest pipeline stopped, {self.depth()} messages left undrained")
@@ -0,0 +1,67 @@
+"""
+## Local Cache
+Bounded in-process LRU cache with a per-entry TTL, used as an L1 in front of Redis
+for data that rarely changes. Entries are dropped explicitly by invalidation
+messages; the TTL bounds staleness if a message is missed.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+from utils.metrics import metrics
+
+class LocalCache:
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped on every invalidation, so a load that raced with one is not stored
+        self.version = 0
+
+        self._hits = metrics.counter(f"{name}.hits")
+        self._misses = metrics.counter(f"{name}.misses")
+        self._evictions = metrics.counter(f"{name}.evictions")
+        self._invalidations = metrics.counter(f"{name}.invalidations")
+        metrics.gauge(f"{name}.size", lambda: len(self._data))
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self._hits.inc()
+                    return value
+                del self._data[key]
+        self._misses.inc()
+        return None
+
+    def set(self, key: Hashable, value: Any, version: int) -> None:
+        """Store a value loaded while the cache was at `version`"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if version != self.version:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._evictions.inc()
+
+    def invalidate(self, key: Hashable | None = None) -> None:
+        """Drop one key, or everything when key is None"""
+        with self._lock:
+            self.version += 1
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+        self._invalidations.inc()
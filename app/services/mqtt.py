@@ -1,18 +1,25 @@
 import math
 import pytz
 from models.device import Schedule
-from utils.config import MQTT_BROKER, MQTT_PORT, DEBUG
-import re
+from utils.config import MQTT_BROKER, MQTT_PORT, MQTT_CLIENT_ID, MQTT_INGEST_ENABLED, MQTT_INGEST_TOPICS, DEBUG
+from utils.config import MQTT_PERSISTENT_SESSION, MQTT_SESSION_EXPIRY, MQTT_RECEIVE_MAXIMUM, MQTT_INSTANCE_ID
 import json
 import random
+import time
 from datetime import datetime
-import json
 from paho.mqtt import client as mqtt_client
-from crud.report import add_data, cache_unknown_device
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+from crud.report import cache_unknown_device
 from utils.logging import logger
+from utils.metrics import metrics
 from services.cache_service import cache_service
+from services.sensor_buffer import sensor_buffer
 from services import alert
-from models.report import SensorFull, SensorModel
+from services.fleet_table import fleet_table
+from services.ingest import AckTracker, Delivery, IngestPipeline
+from services.decoder import StatusPayload, build_record, decode_batch, decode_batch_binary, decode_status, decode_status_binary, parse_topic
+from models.report import SensorRecord
 
 local_tz = pytz.timezone('Asia/Ho_Chi_Minh')  # Or your local timezone
 
@@ -27,100 +34,169 @@ def get_tz_datetime(timestamp: int | None = None) -> datetime:
     
 class Client(mqtt_client.Client):
     def __init__(self):
-        self.ID = "monitoring-" + str(random.randint(100, 999))
-        super().__init__(mqtt_client.CallbackAPIVersion.VERSION2, client_id=self.ID)
+        # A persistent session keeps subscriptions and queues messages on the broker while
+        # the API restarts. It is bound to a client ID that must belong to exactly one
+        # running instance: two consumers of one session take it from each other on every
+        # connect and get in-flight messages redelivered. MQTT_INSTANCE_ID tells replicas apart.
+        self.persistent = MQTT_PERSISTENT_SESSION
+        if self.persistent:
+            self.ID = f"{MQTT_CLIENT_ID}-{MQTT_INSTANCE_ID}"
+            super().__init__(mqtt_client.CallbackAPIVersion.VERSION2, client_id=self.ID,
+                             protocol=mqtt_client.MQTTv5, manual_ack=True)
+        else:
+            self.ID = "monitoring-" + str(random.randint(100, 999))
+            super().__init__(mqtt_client.CallbackAPIVersion.VERSION2, client_id=self.ID)
+        self.qos = 1 if self.persistent else 0
         self.HOST = MQTT_BROKER
         self.PORT = MQTT_PORT
         logger.info(f"Connecting to MQTT Broker: {self.HOST}:{self.PORT}")
         self.ttl = 60 * 5 # 5 minutes
+        # Processing runs on the pipeline workers, not on the network thread
+        self.pipeline = IngestPipeline(self.process_message)
+        self.acks = AckTracker(self.ack)
 
     def connect(self, keepalive=60):
-        super().connect(self.HOST, self.PORT, keepalive)
+        if not self.persistent:
+            super().connect(self.HOST, self.PORT, keepalive)
+            return
+        properties = Properties(PacketTypes.CONNECT)
+        properties.SessionExpiryInterval = MQTT_SESSION_EXPIRY
+        # Receive window: the broker stops sending once this many messages are unacknowledged
+        properties.ReceiveMaximum = MQTT_RECEIVE_MAXIMUM
+        super().connect(self.HOST, self.PORT, keepalive, clean_start=False, properties=properties)
 
-    def handle_status(self, mac, payload: dict):
+    def drain(self, timeout: float = 10):
+        """
+        Graceful shutdown: stop accepting messages, process what is queued, flush the
+        buffered readings so their messages are acknowledged, then disconnect.
+        Anything left unacknowledged stays in the broker session and is redelivered on start.
+        """
+        self.pipeline.stop(timeout)
+        sensor_buffer.flush()
+        self.disconnect()
+        self.loop_stop()
+        if self.persistent:
+            logger.info(f"MQTT client drained, {self.acks.pending()} messages left for redelivery")
+
+    def handle_status(self, mac, payload: bytes, delivery: Delivery | None = None):
         # Validate and parse data
         try:
-            # Parse int "time" to datetime object "timestamp"
-            payload["timestamp"] = get_tz_datetime(payload["time"])
-            payload.pop("time")
-            payload["mac"] = mac
-            payload["energy_meter"] = payload["total_energy"]
-            payload["power_factor"] = round(random.uniform(0.95, 0.97), 2)
-            
-            if payload["voltage"] == 0.0:
-                # Mock data
-                payload["voltage"] = round(random.uniform(230, 240), 1)
-                if payload["toggle"]:   
-                    payload["current"] = round(random.uniform(1.2, 1.4), 1)
-                    payload["power"] = math.ceil(random.uniform(330, 340))
-                else:
-                    payload["current"] = round(random.uniform(0.1, 0.3), 1)
-                    payload["power"] = math.ceil(random.uniform(0, 5))
-                    
-            payload["total_energy"] = (payload["power"] / 1000 / 360) * payload["power_factor"]
-
-            # Process the device status and update cache
-            db_data, full_data = self.preprocess(mac, payload)
-            if db_data is None or full_data is None:
-                return
-            tenant_id = full_data.tenant_id
-            # Insert data to MongoDB
-            add_data(db_data, tenant_id)
-
-            # Downstream processing and alerting
-            alert.process_data(full_data, tenant_id)
-
+            with metrics.timer("ingest.stage.decode"):
+                status = decode_status(payload)
+            self.handle_reading(mac, status, delivery)
         except Exception as e:
             logger.error(f"Failed to parse data from {mac}: {e}")
+
+    def handle_status_binary(self, mac, payload: bytes, delivery: Delivery | None = None):
+        try:
+            with metrics.timer("ingest.stage.decode"):
+                status = decode_status_binary(payload)
+            self.handle_reading(mac, status, delivery)
+        except Exception as e:
+            logger.error(f"Failed to parse binary data from {mac}: {e}")
+
+    def handle_batch(self, gateway: str, payload: bytes, binary: bool = False, delivery: Delivery | None = None):
+        """
+        Process a gateway batch of readings.
+        The schedule status of the whole batch is evaluated in one pass over the fleet table.
+        """
+        try:
+            with metrics.timer("ingest.stage.decode"):
+                readings = decode_batch_binary(payload) if binary else decode_batch(payload)
+        except Exception as e:
+            logger.error(f"Failed to parse batch from gateway {gateway}: {e}")
             return
-    
-    def preprocess(self, mac: str, payload: dict):
+        records = []
+        for mac, status in readings:
+            try:
+                record = self.prepare(mac, status)
+                if record is not None:
+                    records.append(record)
+            except Exception as e:
+                logger.error(f"Failed to process reading of {mac} from gateway {gateway}: {e}")
+        try:
+            with metrics.timer("ingest.stage.batch_status"):
+                statuses = fleet_table.evaluate_records(records)
+        except Exception as e:
+            logger.error(f"Failed to evaluate batch from gateway {gateway}: {e}")
+            statuses = [None] * len(records)
+        for record, schedule_status in zip(records, statuses):
+            try:
+                self.dispatch(record, delivery, schedule_status)
+            except Exception as e:
+                logger.error(f"Failed to process reading of {record.mac} from gateway {gateway}: {e}")
+
+    def handle_reading(self, mac: str, status: StatusPayload, delivery: Delivery | None = None):
+        """
+        Shared preprocessing, persistence and alerting for a decoded reading.
+        The delivery is held by the write buffer until the reading is durable.
         """
-        Preprocess raw payload
+        record = self.prepare(mac, status)
+        if record is not None:
+            self.dispatch(record, delivery)
+
+    def prepare(self, mac: str, status: StatusPayload) -> SensorRecord | None:
+        """Build the record of a decoded reading, None for unknown devices"""
+        # Process the device status and update cache
+        record = self.preprocess(mac, status)
+        if record is None:
+            return None
+        record.power_factor = round(random.uniform(0.95, 0.97), 2)
+
+        if record.voltage == 0.0:
+            # Mock data
+            record.voltage = round(random.uniform(230, 240), 1)
+            if record.toggle:
+                record.current = round(random.uniform(1.2, 1.4), 1)
+                record.power = math.ceil(random.uniform(330, 340))
+            else:
+                record.current = round(random.uniform(0.1, 0.3), 1)
+                record.power = math.ceil(random.uniform(0, 5))
+
+        record.total_energy = (record.power / 1000 / 360) * record.power_factor
+        return record
+
+    def dispatch(self, record: SensorRecord, delivery: Delivery | None = None, schedule_status: tuple | None = None):
+        """Cache, persist and alert on a record, with its schedule status if already evaluated"""
+        # Update device in cache with new sensor data
+        with metrics.timer("ingest.stage.cache_update", record.tenant_id):
+            cache_service.update_device_sensor(record.sensor_fields())
+
+        # Queue data for bulk insertion into MongoDB
+        with metrics.timer("ingest.stage.persist", record.tenant_id):
+            sensor_buffer.add(record, record.tenant_id, delivery)
 
-        1. Get the current device info from cache. 
-           - a. If not exist then get from mongodb. 
-           - b. If still not exist then return.
-        2. Format and prepare data for MongoDB and downstream processing
-        3. Return both the device data for db insertion and the sensor data for processing.
+        # Downstream processing and alerting
+        alert.process_data(record, record.tenant_id, schedule_status)
+
+    def preprocess(self, mac: str, status: StatusPayload) -> SensorRecord | None:
+        """
+        Preprocess a decoded status payload
+
+        1. Get the current device info from cache.
+           - If not exist then remember the MAC as unknown and return.
+        2. Build a single record used for both MongoDB insertion and downstream processing.
         """
         try:
-            # Transform GPS coordinates
-            payload["latitude"] = payload.get("gps_lat", 0)
-            payload["longitude"] = payload.get("gps_log", 0)
-            if "gps_lat" in payload: del payload["gps_lat"]
-            if "gps_log" in payload: del payload["gps_log"]
-            
             # Get device info from cache
-            device_info = cache_service.get_device_by_mac(mac)
+            with metrics.timer("ingest.stage.cache_lookup"):
+                device_info = cache_service.get_device_info(mac)
             if not device_info:
-                # Try to get from database via cache service
                 cache_unknown_device(mac)
-                # logger.warning(f"Device with MAC {mac} not found in cache, cannot update status")
-                return None, None
-                
-            # Update device in cache with new sensor data
-            cache_service.update_device_sensor(payload)
-            
-            # Combine device info with sensor data
-            device_data = {**device_info, **payload}
-            
-            # Ensure device_id and device_name are properly set
-            device_data["device_id"] = str(device_data.get("_id"))
-            device_data["device_name"] = device_data.get("name")
-            
-            # Create properly formatted data models
-            sensor_data = SensorModel(**device_data)     # for MongoDB insertion
-            sensor_full = SensorFull(**device_data)      # for status determination downstream
-            
-            return sensor_data, sensor_full
-          
+                return None
+            return build_record(mac, status, device_info)
+
         except Exception as e:
             logger.error(f"Error processing device status for {mac}: {e}")
-            return None, None
+            return None
 
-    def handle_connection(self, mac: str, payload):
-        pass
+    def handle_connection(self, mac: str):
+        """
+        Heartbeat on `unit/<mac>/alive`: only refresh the device's last seen marker.
+        No decoding, no MongoDB write, no model and no event, so devices can send it often.
+        """
+        if not cache_service.touch_device(mac, time.time()):
+            cache_unknown_device(mac)
 
     def toggle_device(self, mac, state: bool):
         self.set_auto(mac, False)
@@ -184,25 +260,39 @@ class Client(mqtt_client.Client):
     ## Override
     def on_connect(self, client, userdata, flags, reason_code, properties=None):
         logger.info(f"Connected with result code {reason_code}")
-        self.subscribe("unit/+/status")
-        self.subscribe("unit/+/alive")
+        if self.persistent:
+            forgotten = self.acks.reset()
+            logger.info(f"MQTT session present: {flags.session_present}, {forgotten} unacknowledged messages left for redelivery")
+        if not MQTT_INGEST_ENABLED:
+            # Ingest runs in the standalone worker processes (ingest_worker.py)
+            return
+        for topic in MQTT_INGEST_TOPICS:
+            self.subscribe(topic, self.qos)
 
     def on_disconnect(self, client, userdata, flags, reason_code, properties=None):
         logger.info(f"Disconnected with result code {reason_code}")
 
     def on_message(self, client, userdata, message):
+        delivery = self.acks.track(message.mid, message.qos) if self.persistent and message.qos else None
+        self.pipeline.submit(message.topic, message.payload, delivery)
+
+    def process_message(self, topic: str, payload: bytes, recv_ts: float, delivery: Delivery | None = None):
+        """Dispatch a raw message from the ingest queue to its handler"""
         try:
-            topic = message.topic
-            match = re.match(r"unit/(\w+)/(status|alive)", topic)
-            if match:
-                mac_address, _type = match.groups()
-                body = message.payload.decode("utf-8")
+            with metrics.timer("ingest.stage.topic_match"):
+                parsed = parse_topic(topic)
+            if parsed:
+                key, _type = parsed
                 if _type == "status":
-                    payload = json.loads(body)
-                    self.handle_status(mac_address, payload)
+                    self.handle_status(key, payload, delivery)
+                elif _type == "status/bin":
+                    self.handle_status_binary(key, payload, delivery)
+                elif _type == "batch":
+                    self.handle_batch(key, payload, delivery=delivery)
+                elif _type == "batch/bin":
+                    self.handle_batch(key, payload, binary=True, delivery=delivery)
                 elif _type == "alive":
-                    payload = json.loads(body)
-                    self.handle_connection(mac_address, payload)
+                    self.handle_connection(key)
             else:
                 logger.error(f"Unknown topic: {topic}")
         except json.JSONDecodeError as e:
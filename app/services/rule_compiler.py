@@ -0,0 +1,140 @@
+"""
+## Rule Compiler
+Compiles alert rules (models.alert_rule) into per-device-group predicates.
+
+Per metric and operator the thresholds are sorted, so the rules a reading matches are
+a prefix found with one bisect, and the most severe rule of every prefix is precomputed.
+A message costs one bisect per metric and operator, however many rules there are.
+
+A rule with a duration matches once the reading has stayed beyond its threshold that
+long, measured on device timestamps.
+"""
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+from models.alert import AlertSeverity
+from models.alert_rule import AlertRule, RuleMetric, RuleOperator
+from models.report import SensorRecord
+
+SEVERITY_RANK = {AlertSeverity.NORMAL: 0, AlertSeverity.WARNING: 1, AlertSeverity.CRITICAL: 2}
+INF = float("inf")
+
+class RuleChain:
+    """Rules on one metric and operator, sorted so the matched rules are a prefix"""
+    __slots__ = ("metric", "sign", "keys", "rules", "instant_best", "timed_min")
+
+    def __init__(self, metric: RuleMetric, operator: RuleOperator, rules: List[AlertRule]):
+        self.metric = metric.value
+        # ABOVE matches threshold < value, BELOW matches -threshold < -value
+        self.sign = 1 if operator == RuleOperator.ABOVE else -1
+        self.rules = sorted(rules, key=lambda rule: self.sign * rule.threshold)
+        self.keys = [self.sign * rule.threshold for rule in self.rules]
+        self.instant_best = self._best_prefixes()
+        # Most severe first, rules with a duration only
+        self.timed_min = [
+            table for severity in sorted(SEVERITY_RANK, key=SEVERITY_RANK.get, reverse=True)
+            if (table := self._min_table(severity))
+        ]
+
+    def _best_prefixes(self) -> List[Optional[int]]:
+        """Index of the most severe rule without duration in each prefix, the tightest threshold on ties"""
+        best: List[Optional[int]] = [None]
+        for index, rule in enumerate(self.rules):
+            current = best[-1]
+            if rule.duration == 0 and (current is None or SEVERITY_RANK[rule.severity] >= SEVERITY_RANK[self.rules[current].severity]):
+                current = index
+            best.append(current)
+        return best
+
+    def _min_table(self, severity: AlertSeverity) -> List[List[Tuple[float, int]]]:
+        """Sparse table of (duration, index) minimums over ranges of rules of one severity with a duration"""
+        level = [
+            (rule.duration, index) if rule.duration > 0 and rule.severity == severity else (INF, index)
+            for index, rule in enumerate(self.rules)
+        ]
+        if all(duration == INF for duration, _ in level):
+            return []
+        # table[k][i]: minimum of [i, i + 2 ** k)
+        table = [level]
+        width = 1
+        while width * 2 <= len(self.rules):
+            level = [min(level[i], level[i + width]) for i in range(len(self.rules) - width * 2 + 1)]
+            table.append(level)
+            width *= 2
+        return table
+
+    @staticmethod
+    def _range_min(table: List[List[Tuple[float, int]]], start: int, end: int) -> Tuple[float, int]:
+        """Minimum of [start, end), end > start"""
+        k = (end - start).bit_length() - 1
+        return min(table[k][start], table[k][end - (1 << k)])
+
+    def timed_best(self, track: "DurationTrack", now: float) -> Optional[int]:
+        """Index of the most severe rule with a duration matched for at least that duration"""
+        for table in self.timed_min:
+            start = 0
+            for count, since in zip(track.counts, track.since):
+                duration, index = self._range_min(table, start, count)
+                if duration <= now - since:
+                    return index
+                start = count
+        return None
+
+    def matched(self, value: float) -> int:
+        """Number of rules the value matches"""
+        return bisect_left(self.keys, self.sign * value)
+
+class DurationTrack:
+    """
+    Since when each matched rule of a chain has been matched, for one device.
+    Segments (count, since): rules below `count` not covered by an earlier segment
+    have matched continuously since `since`.
+    """
+    __slots__ = ("counts", "since")
+
+    def __init__(self):
+        self.counts: List[int] = []
+        self.since: List[float] = []
+
+    def update(self, matched: int, now: float) -> None:
+        kept = None
+        while self.counts and self.counts[-1] > matched:
+            self.counts.pop()
+            kept = self.since.pop()
+        if matched and (not self.counts or self.counts[-1] < matched):
+            self.counts.append(matched)
+            self.since.append(now if kept is None else kept)
+
+
+class CompiledRules:
+    """The rules of one group of devices, with the duration state of its devices"""
+    def __init__(self, rules: List[AlertRule]):
+        grouped: Dict[Tuple[RuleMetric, RuleOperator], List[AlertRule]] = {}
+        for rule in rules:
+            grouped.setdefault((rule.metric, rule.operator), []).append(rule)
+        self.chains = [RuleChain(metric, operator, chain) for (metric, operator), chain in grouped.items()]
+        self.timed = any(rule.duration > 0 for rule in rules)
+        self.tracks: Dict[str, List[DurationTrack]] = {}
+
+    def evaluate(self, record: SensorRecord) -> Optional[AlertRule]:
+        """The most severe rule the record matches, if any"""
+        best = None
+        tracks = None
+        if self.timed:
+            tracks = self.tracks.get(record.device_id)
+            if tracks is None:
+                tracks = self.tracks[record.device_id] = [DurationTrack() for _ in self.chains]
+            now = record.timestamp.timestamp()
+        for position, chain in enumerate(self.chains):
+            matched = chain.matched(getattr(record, chain.metric))
+            candidates = [chain.instant_best[matched]]
+            if tracks is not None:
+                track = tracks[position]
+                track.update(matched, now)
+                candidates.append(chain.timed_best(track, now))
+            for index in candidates:
+                if index is None:
+                    continue
+                rule = chain.rules[index]
+                if best is None or SEVERITY_RANK[rule.severity] > SEVERITY_RANK[best.severity]:
+                    best = rule
+        return best
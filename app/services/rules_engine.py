@@ -0,0 +1,171 @@
+"""
+## Rules Engine
+Evaluates the alert rules of each tenant on every status message.
+
+Rules are loaded from `tenant_<id>.alert_rules` and compiled (services.rule_compiler)
+once per group of devices sharing the same rules. Ingest pins a device to one worker,
+so the duration state of a device is kept in process.
+
+Rule writes publish on `alert_rules:reload` and every process reloads the tenant on its
+next message. Rules are also reloaded after RULES_RELOAD_INTERVAL, which covers edits
+made directly in MongoDB.
+
+Loads run in a background thread, never on the ingest path: until a load completes the
+current rules (none for a tenant seen for the first time) keep being served, and a
+failed load is retried with exponential backoff, so a slow or unreachable MongoDB never
+stalls ingest.
+"""
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from database.mongo import get_alert_rules_collection
+from database.redis import get_redis_connection
+from models.alert import AlertSeverity, DeviceState
+from models.alert_rule import AlertRule
+from models.report import SensorRecord
+from services.rule_compiler import CompiledRules
+from utils.config import RULES_RELOAD_INTERVAL, RULES_RETRY_INTERVAL
+from utils.logging import logger
+from utils.metrics import metrics
+
+Match = Tuple[DeviceState, AlertSeverity]
+
+class TenantRules:
+    def __init__(self, rules: List[AlertRule]):
+        self.rules = [rule for rule in rules if rule.enabled]
+        self.loaded_at = time.monotonic()
+        # Set by an invalidation, reloaded on the next message
+        self.stale = False
+        self._groups: Dict[Tuple[str, ...], CompiledRules] = {}
+        self._devices: Dict[str, CompiledRules] = {}
+
+    def for_device(self, device_id: str) -> Optional[CompiledRules]:
+        compiled = self._devices.get(device_id)
+        if compiled is None:
+            rules = [rule for rule in self.rules if not rule.devices or device_id in rule.devices]
+            if not rules:
+                return None
+            # Devices with the same rules share one compiled group
+            key = tuple(str(rule.id) for rule in rules)
+            compiled = self._groups.get(key)
+            if compiled is None:
+                compiled = self._groups[key] = CompiledRules(rules)
+            self._devices[device_id] = compiled
+        return compiled
+
+class RulesEngine:
+    RELOAD_CHANNEL = "alert_rules:reload"
+
+    def __init__(self, reload_interval: float = RULES_RELOAD_INTERVAL, retry_interval: float = RULES_RETRY_INTERVAL):
+        self.reload_interval = reload_interval
+        self.retry_interval = retry_interval
+        self._tenants: Dict[str, TenantRules] = {}
+        # Tenants being loaded, and when a tenant whose load failed is retried
+        self._loading: set[str] = set()
+        # Tenants invalidated while loading, the load may have read the old rules
+        self._invalidated: set[str] = set()
+        self._failures: Dict[str, int] = {}
+        self._retry_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._listener = None
+
+        self._loads = metrics.counter("rules.loads")
+        self._load_failures = metrics.counter("rules.load_failures")
+        self._matches = metrics.counter("rules.matches")
+        metrics.gauge("rules.tenants", lambda: len(self._tenants))
+
+    def _load(self, tenant_id: str) -> None:
+        try:
+            rules = [AlertRule(**rule) for rule in get_alert_rules_collection(tenant_id).find({"enabled": True})]
+        except Exception as e:
+            with self._lock:
+                failures = self._failures[tenant_id] = self._failures.get(tenant_id, 0) + 1
+                backoff = min(self.reload_interval, self.retry_interval * 2 ** (failures - 1))
+                self._retry_at[tenant_id] = time.monotonic() + backoff
+                self._loading.discard(tenant_id)
+                self._invalidated.discard(tenant_id)
+            self._load_failures.inc()
+            # The current rules stay in use until a load succeeds
+            logger.error(f"Failed to load alert rules of tenant {tenant_id}, retrying in {backoff:.0f}s: {e}")
+            return
+        with self._lock:
+            loaded = self._tenants[tenant_id] = TenantRules(rules)
+            if tenant_id in self._invalidated:
+                self._invalidated.discard(tenant_id)
+                loaded.stale = True
+            self._failures.pop(tenant_id, None)
+            self._retry_at.pop(tenant_id, None)
+            self._loading.discard(tenant_id)
+        self._loads.inc()
+        logger.debug(f"Loaded {len(rules)} alert rules of tenant {tenant_id}")
+
+    def tenant(self, tenant_id: str) -> Optional[TenantRules]:
+        """Current rules of a tenant, a reload is started in the background when they are due"""
+        rules = self._tenants.get(tenant_id)
+        now = time.monotonic()
+        if rules is not None and not rules.stale and now - rules.loaded_at <= self.reload_interval:
+            return rules
+        with self._lock:
+            if tenant_id in self._loading or now < self._retry_at.get(tenant_id, 0):
+                return rules
+            self._loading.add(tenant_id)
+        threading.Thread(target=self._load, args=(tenant_id,), name=f"rules-load-{tenant_id}", daemon=True).start()
+        return rules
+
+    def evaluate(self, record: SensorRecord) -> Optional[Match]:
+        """State and severity of the most severe rule the record matches"""
+        if not record.tenant_id:
+            return None
+        rules = self.tenant(record.tenant_id)
+        compiled = rules.for_device(record.device_id) if rules else None
+        if compiled is None:
+            return None
+        rule = compiled.evaluate(record)
+        if rule is None:
+            return None
+        self._matches.inc()
+        return rule.state, rule.severity
+
+    def _invalidate(self, tenant_id: str) -> None:
+        with self._lock:
+            rules = self._tenants.get(tenant_id)
+            if rules is not None:
+                rules.stale = True
+            if tenant_id in self._loading:
+                self._invalidated.add(tenant_id)
+            # A rule change is worth an immediate attempt even while backing off
+            self._retry_at.pop(tenant_id, None)
+
+    def reload(self, tenant_id: str) -> None:
+        """Reload the rules of a tenant in every process"""
+        self._invalidate(tenant_id)
+        try:
+            get_redis_connection().publish(self.RELOAD_CHANNEL, tenant_id)
+        except Exception as e:
+            logger.error(f"Failed to publish alert rules reload: {e}")
+
+    def _handle_reload(self, message) -> None:
+        self._invalidate(message["data"])
+
+    def _handle_listener_error(self, e, pubsub, thread) -> None:
+        # Reloads may have been missed while disconnected
+        logger.error(f"Alert rules reload listener error: {e}")
+        for rules in list(self._tenants.values()):
+            rules.stale = True
+        time.sleep(1)
+
+    def start_reload_listener(self) -> None:
+        """Listen for rule changes from other processes in a background thread"""
+        if self._listener:
+            return
+        pubsub = get_redis_connection().pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{self.RELOAD_CHANNEL: self._handle_reload})
+        self._listener = pubsub.run_in_thread(sleep_time=1.0, daemon=True, exception_handler=self._handle_listener_error)
+
+    def stop_reload_listener(self) -> None:
+        if self._listener:
+            self._listener.stop()
+            self._listener = None
+
+# Create a singleton instance
+rules_engine = RulesEngine()
@@ -0,0 +1,173 @@
+"""
+## Scheduler
+Runs periodic background jobs (idle check, rollups, retention) once per interval
+across every process and replica, instead of once per uvicorn worker.
+
+Each job has a Redis lease `scheduler:lease:<job>` holding `<owner>:<token>`. The
+process that takes the lease runs the job and keeps the lease until one interval after
+the run started, so no other process runs it in between. Tokens come from
+`scheduler:fence:<job>` and only grow: a process renews or shortens the lease only
+while it still holds its own token, so a run that outlasts its lease is detected
+instead of overwriting the new holder. Processes that lose the race sleep until the
+lease expires, plus jitter so they do not all retry at once.
+
+Sync jobs run in a thread, so a slow job never blocks the event loop.
+"""
+import asyncio
+import os
+import random
+import socket
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional, Union
+from database.redis import get_async_redis_connection
+from utils.config import SCHEDULER_JITTER
+from utils.logging import logger
+from utils.metrics import metrics
+
+# Take the lease if it is free. KEYS: lease, fence. ARGV: owner, ttl (ms)
+# Returns {1, token} when taken, {0, remaining ttl (ms)} when held by another process
+ACQUIRE_LEASE_SCRIPT = """
+local ttl = redis.call('PTTL', KEYS[1])
+if ttl ~= -2 then
+    return {0, ttl}
+end
+local token = redis.call('INCR', KEYS[2])
+redis.call('SET', KEYS[1], ARGV[1] .. ':' .. token, 'PX', ARGV[2])
+return {1, token}
+"""
+
+# Set the lease ttl only while it still holds our token. KEYS: lease. ARGV: value, ttl (ms)
+RENEW_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+JobFunc = Callable[[], Union[None, Awaitable[None]]]
+
+@dataclass
+class Job:
+    name: str
+    func: JobFunc
+    interval: float
+    # Fraction of the interval added at random before each attempt
+    jitter: float = SCHEDULER_JITTER
+
+class Scheduler:
+    LEASE_PREFIX = "scheduler:lease:"
+    FENCE_PREFIX = "scheduler:fence:"
+
+    def __init__(self):
+        self.owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._jobs: Dict[str, Job] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._leader: Dict[str, bool] = {}
+        self._acquire = None
+        self._renew = None
+
+    def add_job(self, name: str, func: JobFunc, interval: float, jitter: float = SCHEDULER_JITTER) -> None:
+        """Register a job, run at most once per `interval` seconds cluster-wide"""
+        self._jobs[name] = Job(name, func, interval, jitter)
+        metrics.gauge(f"scheduler.{name}.leader", lambda: int(self._leader.get(name, False)))
+
+    async def _scripts(self):
+        if self._acquire is None:
+            redis = await get_async_redis_connection()
+            self._acquire = redis.register_script(ACQUIRE_LEASE_SCRIPT)
+            self._renew = redis.register_script(RENEW_LEASE_SCRIPT)
+        return self._acquire, self._renew
+
+    async def _try_acquire(self, job: Job) -> tuple[Optional[str], float]:
+        """Returns (lease value, 0) when taken, else (None, seconds until the lease expires)"""
+        acquire, _ = await self._scripts()
+        taken, value = await acquire(
+            keys=[f"{self.LEASE_PREFIX}{job.name}", f"{self.FENCE_PREFIX}{job.name}"],
+            args=[self.owner, int(job.interval * 1000)],
+        )
+        if taken:
+            return f"{self.owner}:{value}", 0.0
+        # -1: a lease without ttl, left by hand; retry after one interval
+        return None, value / 1000 if value >= 0 else job.interval
+
+    async def _renew_lease(self, job: Job, lease: str, ttl: float) -> bool:
+        _, renew = await self._scripts()
+        held = await renew(keys=[f"{self.LEASE_PREFIX}{job.name}"], args=[lease, max(1, int(ttl * 1000))])
+        return bool(held)
+
+    async def _run_once(self, job: Job, lease: str) -> float:
+        """
+        Run the job, extending the lease while it runs so nobody else starts it.
+        Returns the seconds the run took.
+        """
+        started = time.monotonic()
+        if asyncio.iscoroutinefunction(job.func):
+            run = asyncio.ensure_future(job.func())
+        else:
+            run = asyncio.ensure_future(asyncio.to_thread(job.func))
+        held = True
+        try:
+            while True:
+                done, _ = await asyncio.wait({run}, timeout=job.interval / 2)
+                if done:
+                    break
+                if held and not await self._renew_lease(job, lease, job.interval):
+                    held = False
+                    metrics.counter(f"scheduler.{job.name}.lease_lost").inc()
+                    logger.warning(f"Scheduler lost the lease of job {job.name} while it was running")
+            run.result()
+            metrics.counter(f"scheduler.{job.name}.runs").inc()
+        except asyncio.CancelledError:
+            run.cancel()
+            raise
+        except Exception as e:
+            metrics.counter(f"scheduler.{job.name}.failures").inc()
+            logger.error(f"Scheduled job {job.name} failed: {e}")
+        finally:
+            elapsed = time.monotonic() - started
+            metrics.histogram(f"scheduler.{job.name}.duration_ms").observe(elapsed * 1000)
+        if held:
+            # Keep the lease until one interval after the start, which spaces the runs
+            await self._renew_lease(job, lease, job.interval - elapsed)
+        return elapsed
+
+    async def _loop(self, job: Job) -> None:
+        # Spread the first attempts of processes started together
+        await asyncio.sleep(random.uniform(0, job.interval * job.jitter))
+        while True:
+            try:
+                lease, wait = await self._try_acquire(job)
+                self._leader[job.name] = lease is not None
+                if lease is None:
+                    metrics.counter(f"scheduler.{job.name}.skipped").inc()
+                else:
+                    elapsed = await self._run_once(job, lease)
+                    wait = max(0.0, job.interval - elapsed)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Scheduler failed to run job {job.name}: {e}")
+                wait = job.interval
+            await asyncio.sleep(wait + random.uniform(0, job.interval * job.jitter))
+
+    def start(self) -> None:
+        """Start one loop per registered job, call from a running event loop"""
+        for name, job in self._jobs.items():
+            if name not in self._tasks or self._tasks[name].done():
+                self._tasks[name] = asyncio.create_task(self._loop(job), name=f"scheduler-{name}")
+        logger.info(f"Scheduler started {len(self._jobs)} jobs as {self.owner}")
+
+    async def stop(self) -> None:
+        """Cancel the job loops. Leases are left to expire so a restart does not rerun early."""
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        logger.info("Scheduler stopped")
+
+# Create a singleton instance
+scheduler = Scheduler()
@@ -0,0 +1,183 @@
+"""
+## Sensor Write Buffer
+This service collects sensor readings per tenant and writes them to MongoDB in bulk,
+instead of issuing a lookup and an insert for every MQTT message.
+Writes happen on the flush thread, so ingest never waits on MongoDB. Batches that
+cannot be written, or that exceed the buffer limit, go to the local spool.
+MQTT deliveries of buffered readings are released once their batch is written or spooled;
+a batch the spool rejects too stays buffered, unacknowledged, until a later flush.
+"""
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Tuple
+from pymongo.errors import BulkWriteError, PyMongoError
+from crud.report import add_data_many
+from models.report import SensorRecord
+from services.ingest import Delivery
+from services.spool import spool
+from utils.config import SENSOR_BATCH_SIZE, SENSOR_FLUSH_INTERVAL, SENSOR_DEDUP_SIZE, SENSOR_BUFFER_LIMIT
+from utils.logging import logger
+from utils.metrics import metrics
+
+class SensorWriteBuffer:
+    def __init__(self, batch_size: int = SENSOR_BATCH_SIZE, flush_interval: float = SENSOR_FLUSH_INTERVAL,
+                 dedup_size: int = SENSOR_DEDUP_SIZE, limit: int = SENSOR_BUFFER_LIMIT):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dedup_size = dedup_size
+        self.limit = limit
+        self._pending = 0
+        self._buffers: Dict[str, List[dict]] = defaultdict(list)
+        self._deliveries: Dict[str, List[Delivery]] = defaultdict(list)
+        # Recently accepted (device_id, timestamp) keys.
+        # Time-series collections cannot carry a unique index, so dedup is done in memory.
+        self._recent: OrderedDict[Tuple[str, float], None] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+
+        self._batch_size = metrics.histogram("sensor_buffer.batch_size")
+        self._flush_latency = metrics.histogram("sensor_buffer.flush_latency_ms")
+        self._written = metrics.counter("sensor_buffer.written")
+        self._duplicates = metrics.counter("sensor_buffer.duplicates")
+        self._failed = metrics.counter("sensor_buffer.failed")
+        self._spooled = metrics.counter("sensor_buffer.spooled")
+        metrics.gauge("sensor_buffer.pending", self.pending)
+
+    def add(self, data: SensorRecord, tenant_id: str, delivery: Delivery | None = None) -> bool:
+        """
+        Queue a sensor reading for insertion.
+        The delivery, if any, is held until the reading is written or spooled.
+        Returns False if the reading is a duplicate of a recently accepted one.
+        """
+        key = (data.device_id, data.timestamp.timestamp())
+        batch = None
+        deliveries = None
+        with self._lock:
+            if key in self._recent:
+                self._duplicates.inc()
+                return False
+            self._recent[key] = None
+            if len(self._recent) > self.dedup_size:
+                self._recent.popitem(last=False)
+
+            buffer = self._buffers[tenant_id]
+            buffer.append(data.to_document())
+            if delivery:
+                self._deliveries[tenant_id].append(delivery.hold())
+            self._pending += 1
+            if len(buffer) >= self.batch_size:
+                if self._pending > self.limit:
+                    # MongoDB is not keeping up, divert this tenant's batch to disk
+                    batch = self._buffers.pop(tenant_id)
+                    deliveries = self._deliveries.pop(tenant_id, None)
+                    self._pending -= len(batch)
+                else:
+                    self._wake.set()
+        if batch:
+            if self._spool(tenant_id, batch):
+                self._release(deliveries)
+            else:
+                self._requeue(tenant_id, batch, deliveries)
+        return True
+
+    def pending(self) -> int:
+        """Number of readings waiting to be flushed"""
+        return self._pending
+
+    def flush(self) -> None:
+        """Write every pending tenant buffer to MongoDB"""
+        with self._lock:
+            buffers = self._buffers
+            deliveries = self._deliveries
+            self._buffers = defaultdict(list)
+            self._deliveries = defaultdict(list)
+        for tenant_id, batch in buffers.items():
+            if batch:
+                durable = self._write(tenant_id, batch)
+                with self._lock:
+                    self._pending -= len(batch)
+                if not durable:
+                    self._requeue(tenant_id, batch, deliveries.get(tenant_id))
+                    continue
+            self._release(deliveries.get(tenant_id))
+
+    def _release(self, deliveries: List[Delivery] | None) -> None:
+        """Let the MQTT client acknowledge messages whose readings are written or spooled"""
+        for delivery in deliveries or ():
+            delivery.release()
+
+    def _requeue(self, tenant_id: str, batch: List[dict], deliveries: List[Delivery] | None) -> None:
+        """Put back a batch that was neither written nor spooled, its deliveries stay held"""
+        with self._lock:
+            self._buffers[tenant_id][:0] = batch
+            if deliveries:
+                self._deliveries[tenant_id][:0] = deliveries
+            self._pending += len(batch)
+
+    def _spool(self, tenant_id: str, batch: List[dict]) -> bool:
+        """Append a batch to the spool, returns False if it could not be written"""
+        try:
+            spool.write(tenant_id, batch)
+            self._spooled.inc(len(batch))
+            return True
+        except Exception as e:
+            logger.error(f"Failed to spool {len(batch)} sensor readings for tenant {tenant_id}, retrying on the next flush: {e}")
+            return False
+
+    def _write(self, tenant_id: str, batch: List[dict]) -> bool:
+        """Insert a batch, spooling it if MongoDB is unavailable. Returns False if it is neither written nor spooled."""
+        start = time.perf_counter()
+        try:
+            inserted = add_data_many(batch, tenant_id)
+            self._written.inc(inserted)
+        except BulkWriteError as e:
+            # Unordered insert keeps going past failed documents
+            inserted = e.details.get("nInserted", 0)
+            self._written.inc(inserted)
+            self._failed.inc(len(batch) - inserted)
+            logger.error(f"Partial sensor batch write for tenant {tenant_id}: {len(batch) - inserted} failed")
+        except PyMongoError as e:
+            logger.warning(f"Failed to write sensor batch for tenant {tenant_id}, spooling: {e}")
+            return self._spool(tenant_id, batch)
+        except Exception as e:
+            self._failed.inc(len(batch))
+            logger.error(f"Failed to write sensor batch for tenant {tenant_id}: {e}")
+        finally:
+            self._batch_size.observe(len(batch))
+            self._flush_latency.observe((time.perf_counter() - start) * 1000)
+        return True
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            # Wake up early when a tenant batch is full
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error in sensor buffer flush loop: {e}")
+
+    def start(self) -> None:
+        """Start the periodic flush thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sensor-buffer", daemon=True)
+        self._thread.start()
+        logger.info(f"Sensor write buffer started (batch size {self.batch_size}, interval {self.flush_interval}s)")
+
+    def stop(self) -> None:
+        """Stop the flush thread and write whatever is still pending"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=self.flush_interval * 2)
+            self._thread = None
+        self.flush()
+        logger.info("Sensor write buffer flushed and stopped")
+
+# Create a singleton instance
+sensor_buffer = SensorWriteBuffer()
@@ -0,0 +1,214 @@
+"""
+## Sensor Spool
+Local write-ahead spool for sensor readings that could not be written to MongoDB.
+Batches are appended to rotating segment files; a background replayer drains the
+closed segments into the tenant sensor collections once MongoDB is reachable again.
+
+Processes may share the spool directory (API workers and replicas mount the same
+SPOOL_DIR). A segment is flocked while it is written or replayed, so no process
+replays a segment another one still holds, and none is replayed twice.
+"""
+import fcntl
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import List
+from bson import json_util
+from pymongo.errors import BulkWriteError, PyMongoError
+from crud.report import add_data_many
+from utils.config import SPOOL_DIR, SPOOL_SEGMENT_BYTES, SPOOL_REPLAY_INTERVAL, SPOOL_REPLAY_BATCH
+from utils.logging import logger
+from utils.metrics import metrics
+
+SEGMENT_SUFFIX = ".jsonl"
+OFFSET_SUFFIX = ".offset"
+
+class SensorSpool:
+    def __init__(self, directory: str = SPOOL_DIR, segment_bytes: int = SPOOL_SEGMENT_BYTES,
+                 replay_interval: float = SPOOL_REPLAY_INTERVAL, replay_batch: int = SPOOL_REPLAY_BATCH):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.replay_interval = replay_interval
+        self.replay_batch = replay_batch
+        self._active = None
+        self._active_path: str | None = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+        self._written = metrics.counter("spool.written")
+        self._replayed = metrics.counter("spool.replayed")
+        self._replay_rate = metrics.histogram("spool.replay_rate_per_s")
+        metrics.gauge("spool.bytes", self.size)
+        metrics.gauge("spool.segments", lambda: len(self._segments()) + (1 if self._active else 0))
+        metrics.gauge("spool.lag_s", self.lag)
+
+    def _segments(self) -> List[str]:
+        """Closed segments, oldest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        names = sorted(n for n in os.listdir(self.directory) if n.endswith(SEGMENT_SUFFIX))
+        paths = [os.path.join(self.directory, n) for n in names]
+        return [p for p in paths if p != self._active_path]
+
+    def size(self) -> int:
+        """Total bytes waiting in the spool"""
+        if not os.path.isdir(self.directory):
+            return 0
+        return sum(
+            os.path.getsize(os.path.join(self.directory, n))
+            for n in os.listdir(self.directory) if n.endswith(SEGMENT_SUFFIX)
+        )
+
+    def lag(self) -> float:
+        """Age in seconds of the oldest spooled reading"""
+        segments = self._segments()
+        oldest = segments[0] if segments else self._active_path
+        if not oldest:
+            return 0.0
+        try:
+            return max(0.0, time.time() - os.path.getctime(oldest))
+        except OSError:
+            return 0.0
+
+    def write(self, tenant_id: str, docs: List[dict]) -> None:
+        """Durably append sensor documents to the active segment"""
+        if not docs:
+            return
+        lines = "".join(json_util.dumps({"tenant_id": tenant_id, "doc": doc}) + "\n" for doc in docs)
+        with self._lock:
+            if self._active is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._active_path = os.path.join(self.directory, f"segment-{time.time_ns()}-{os.getpid()}{SEGMENT_SUFFIX}")
+                self._active = open(self._active_path, "a", encoding="utf-8")
+                # Held until rotation, keeps other processes from replaying it
+                fcntl.flock(self._active.fileno(), fcntl.LOCK_EX)
+            self._active.write(lines)
+            self._active.flush()
+            os.fsync(self._active.fileno())
+            if self._active.tell() >= self.segment_bytes:
+                self._rotate()
+        self._written.inc(len(docs))
+
+    def _rotate(self) -> None:
+        """Close the active segment, releasing its flock, so a replayer can pick it up. Caller holds the lock."""
+        if self._active is not None:
+            self._active.close()
+            self._active = None
+            self._active_path = None
+
+    def _replay_segment(self, path: str) -> None:
+        """
+        Insert a closed segment into MongoDB and delete it.
+        Progress is checkpointed after every batch, so a failure part-way only retries the remainder.
+        """
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            # Replayed by another process since it was listed
+            return
+        with f:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Still written or being replayed by another process
+                return
+            if not os.path.exists(path):
+                return
+
+            offset_path = path + OFFSET_SUFFIX
+            offset = 0
+            if os.path.exists(offset_path):
+                with open(offset_path) as o:
+                    offset = int(o.read() or 0)
+
+            start = time.perf_counter()
+            replayed = 0
+            f.seek(offset)
+            while True:
+                batch = defaultdict(list)
+                count = 0
+                lines = 0
+                while lines < self.replay_batch:
+                    line = f.readline()
+                    if not line:
+                        break
+                    lines += 1
+                    try:
+                        item = json_util.loads(line)
+                        batch[item["tenant_id"]].append(item["doc"])
+                    except (ValueError, KeyError, TypeError) as e:
+                        # A partial line left by a crash mid-append, would fail on every retry
+                        logger.error(f"Skipped unreadable spool line in {os.path.basename(path)}: {e}: {line[:200]!r}")
+                        continue
+                    count += 1
+                if not lines:
+                    break
+                for tenant_id, docs in batch.items():
+                    try:
+                        add_data_many(docs, tenant_id)
+                    except BulkWriteError as e:
+                        # Document level errors will not succeed on retry either
+                        logger.error(f"Dropped {len(e.details.get('writeErrors', []))} spooled readings for tenant {tenant_id}")
+                self._replayed.inc(count)
+                replayed += count
+                with open(offset_path, "w") as o:
+                    o.write(str(f.tell()))
+
+            # Removed while still locked, so no other process can pick it up again
+            os.remove(path)
+            if os.path.exists(offset_path):
+                os.remove(offset_path)
+
+        elapsed = time.perf_counter() - start
+        if replayed and elapsed > 0:
+            self._replay_rate.observe(replayed / elapsed)
+        logger.info(f"Replayed {replayed} spooled readings from {os.path.basename(path)}")
+
+    def replay(self) -> None:
+        """Drain closed segments into MongoDB, stopping at the first connection failure"""
+        for path in self._segments():
+            try:
+                self._replay_segment(path)
+            except PyMongoError as e:
+                logger.warning(f"MongoDB unavailable, spool replay postponed: {e}")
+                return
+        with self._lock:
+            if self._active_path is None:
+                return
+            # Everything older is drained, hand the active segment over to the replayer
+            path = self._active_path
+            self._rotate()
+        try:
+            self._replay_segment(path)
+        except PyMongoError as e:
+            logger.warning(f"MongoDB unavailable, spool replay postponed: {e}")
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.replay_interval):
+            try:
+                self.replay()
+            except Exception as e:
+                logger.error(f"Error in spool replay loop: {e}")
+
+    def start(self) -> None:
+        """Start the background replayer"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sensor-spool", daemon=True)
+        self._thread.start()
+        logger.info(f"Sensor spool started in {self.directory}")
+
+    def stop(self) -> None:
+        """Stop the replayer and close the active segment; spooled data stays on disk"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.replay_interval * 2)
+            self._thread = None
+        with self._lock:
+            self._rotate()
+
+# Create a singleton instance
+spool = SensorSpool()
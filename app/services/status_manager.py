@@ -1,28 +1,40 @@
 """
 Device Status Manager Service
-Responsible for determining device status based on sensor data and working schedule
+Responsible for determining device status based on sensor data, working schedule
+and the tenant's alert rules (services.rules_engine)
 """
-import pytz
-from datetime import datetime, timedelta
-from models.report import SensorFull
+from models.report import SensorRecord
 from models.alert import DeviceState, AlertSeverity
+from services.rule_compiler import SEVERITY_RANK
+from services.rules_engine import rules_engine
+from utils import local_seconds
+from utils.config import POWER_MIN_THRESHOLD
 from utils.logging import logger
 
-local_tz = pytz.timezone('Asia/Ho_Chi_Minh')
-
-def determine_device_status(sensor_data: SensorFull) -> tuple[DeviceState, AlertSeverity]:
+def determine_device_status(sensor_data: SensorRecord, schedule_status: tuple[DeviceState, AlertSeverity] | None = None) -> tuple[DeviceState, AlertSeverity]:
     """
-    Determine device status based on sensor data and working schedule
+    Determine device status based on sensor data, working schedule and alert rules
+    A matching rule replaces the schedule status when it is more severe
+    `schedule_status` skips the schedule evaluation, see services.fleet_table
     Returns a tuple with device state and alert severity
     """
     if not sensor_data:
         return DeviceState.DISCONNECTED, AlertSeverity.CRITICAL
+    state, severity = schedule_status or _schedule_status(sensor_data)
     try:
-        # Constants
-        POWER_MIN_THRESHOLD = 40
-        
-        # Current time
-        current_time = datetime.now(pytz.UTC).astimezone(local_tz)
+        match = rules_engine.evaluate(sensor_data)
+    except Exception as e:
+        logger.error(f"Error evaluating alert rules: {e}")
+        match = None
+    if match and SEVERITY_RANK[match[1]] > SEVERITY_RANK[severity]:
+        return match
+    return state, severity
+
+def _schedule_status(sensor_data: SensorRecord) -> tuple[DeviceState, AlertSeverity]:
+    """Device status from power, toggle and working schedule"""
+    try:
+        # Current time of day
+        now_s = local_seconds()
         
         # Extract device parameters
         working = sensor_data.power >= POWER_MIN_THRESHOLD
@@ -31,12 +43,10 @@ def determine_device_status(sensor_data: SensorFull) -> tuple[DeviceState, Alert
         voltage = sensor_data.voltage
         
         # Check if device is in working hours
-        in_working_hours = _is_in_working_hours(
-            current_time, 
-            sensor_data.hour_on, 
-            sensor_data.minute_on,
-            sensor_data.hour_off, 
-            sensor_data.minute_off
+        in_hours = in_working_hours(
+            now_s,
+            sensor_data.hour_on * 3600 + sensor_data.minute_on * 60,
+            sensor_data.hour_off * 3600 + sensor_data.minute_off * 60
         )
 
         
@@ -45,7 +55,7 @@ def determine_device_status(sensor_data: SensorFull) -> tuple[DeviceState, Alert
         if voltage > 0:
             if working and toggle:
                 # Device is on and should be on
-                if not auto or (auto and in_working_hours):
+                if not auto or (auto and in_hours):
                     return DeviceState.WORKING, AlertSeverity.NORMAL
                 # Device is on but should be off (out of working hours in auto mode)
                 else:
@@ -53,7 +63,7 @@ def determine_device_status(sensor_data: SensorFull) -> tuple[DeviceState, Alert
             
             elif not working and not toggle:
                 # Device is off and should be off
-                if not auto or (auto and not in_working_hours):
+                if not auto or (auto and not in_hours):
                     return DeviceState.OFF, AlertSeverity.NORMAL
                 # Device is off but should be on (in working hours in auto mode)
                 else:
@@ -79,27 +89,9 @@ def determine_device_status(sensor_data: SensorFull) -> tuple[DeviceState, Alert
         logger.error(f"Error determining device status: {e}")
         return DeviceState.DISCONNECTED, AlertSeverity.CRITICAL
 
-def _is_in_working_hours(current_time: datetime, hour_on: int, minute_on: int, 
-                         hour_off: int, minute_off: int) -> bool:
-    """Check if current time is within working hours"""
-    # Create datetime objects for on/off times
-    time_on = datetime(
-        current_time.year, current_time.month, current_time.day, 
-        hour_on, minute_on, tzinfo=local_tz
-    )
-    
-    time_off = datetime(
-        current_time.year, current_time.month, current_time.day, 
-        hour_off, minute_off, tzinfo=local_tz
-    )
-    
+def in_working_hours(now_s: float, on_s: int, off_s: int) -> bool:
+    """Check if a time of day (seconds since local midnight) is within working hours"""
     # Handle overnight schedules (e.g., 18:00 to 05:00)
-    if hour_off < hour_on or (hour_off == hour_on and minute_off < minute_on):
-        if current_time.hour < hour_off or (current_time.hour == hour_off and current_time.minute < minute_off):
-            # We're in the morning before the off time
-            time_on = time_on - timedelta(days=1)
-        else:
-            # We're in the evening after the on time
-            time_off = time_off + timedelta(days=1)
-    
-    return time_on <= current_time <= time_off
+    if off_s < on_s:
+        return now_s >= on_s or now_s <= off_s
+    return on_s <= now_s <= off_s
@@ -9,4 +9,9 @@ def get_real_time():
 
 def fix_offset(time: datetime):
     localized = pytz.utc.localize(time)
-    return localized.astimezone(local_tz)
\ No newline at end of file
+    return localized.astimezone(local_tz)
+
+def local_seconds(now: datetime | None = None) -> float:
+    """Seconds since local midnight"""
+    now = (now or datetime.now(pytz.UTC)).astimezone(local_tz)
+    return now.hour * 3600 + now.minute * 60 + now.second + now.microsecond / 1e6
@@ -1,3 +1,4 @@
+import socket
 from enum import Enum
 from decouple import config
 # Import all the models in the database
@@ -18,6 +19,13 @@ ACCESS_TOKEN_EXPIRE_MINUTES = config("ACCESS_TOKEN_EXPIRE_MINUTES", default=60,
 MQTT_BROKER = config("MQTT_BROKER")
 MQTT_PORT = int(config("MQTT_PORT"))
 MQTT_CLIENT_ID = config("MQTT_CLIENT_ID")
+MQTT_INGEST_TOPICS = ["unit/+/status", "unit/+/status/bin", "unit/+/alive", "gateway/+/batch", "gateway/+/batch/bin"] # Device topics consumed by the ingest path
+MQTT_INGEST_ENABLED = config("MQTT_INGEST_ENABLED", default=True, cast=bool) # Disable when ingest_worker.py consumes device topics
+MQTT_PERSISTENT_SESSION = config("MQTT_PERSISTENT_SESSION", default=False, cast=bool) # Reconnect as <MQTT_CLIENT_ID>-<MQTT_INSTANCE_ID> with a kept session, QoS 1 and acks after durable writes
+MQTT_INSTANCE_ID = config("MQTT_INSTANCE_ID", default=socket.gethostname()) # Suffix of the persistent session client IDs, must be unique per running instance and stable across its restarts
+MQTT_SESSION_EXPIRY = config("MQTT_SESSION_EXPIRY", default=3600, cast=int) # seconds the broker keeps the session (and queues messages) while disconnected
+MQTT_RECEIVE_MAXIMUM = config("MQTT_RECEIVE_MAXIMUM", default=2000, cast=int) # Unacknowledged messages the broker may have in flight, should cover msg/s * SENSOR_FLUSH_INTERVAL
+MQTT_INGEST_CLIENT_ID = config("MQTT_INGEST_CLIENT_ID", default=f"{MQTT_CLIENT_ID}-ingest") # Prefix of the ingest_worker.py session client ID, suffixed with MQTT_INSTANCE_ID
 
 # Mongo
 MONGO_URI = config("MONGO_URI")
@@ -25,7 +33,51 @@ MONGO_URI = config("MONGO_URI")
 # REDIS
 REDIS_DB = config("REDIS_DB", default=0, cast=int)
 REDIS_PASSWORD = config("REDIS_PASSWORD", default=None)
+REDIS_MAX_CONNECTIONS = config("REDIS_MAX_CONNECTIONS", default=64, cast=int) # Per pool (sync and async), per process
+REDIS_POOL_TIMEOUT = config("REDIS_POOL_TIMEOUT", default=5.0, cast=float) # seconds to wait for a free pooled connection
+REDIS_SOCKET_TIMEOUT = config("REDIS_SOCKET_TIMEOUT", default=0.0, cast=float) # seconds, 0 = no read timeout
+REDIS_CONNECT_TIMEOUT = config("REDIS_CONNECT_TIMEOUT", default=2.0, cast=float) # seconds
+REDIS_HEALTH_CHECK_INTERVAL = config("REDIS_HEALTH_CHECK_INTERVAL", default=30, cast=int) # seconds idle before a connection is pinged on checkout
 
 # RUNTIME CONFIG
 IDLE_TIME = config("IDLE_TIME", default=15, cast=int) # 5 seconds
-POWERLOST_THRESHOLD = 50 # 50W
\ No newline at end of file
+IDLE_CHECK_INTERVAL = config("IDLE_CHECK_INTERVAL", default=3, cast=float) # Seconds between idle device checks
+ALERT_RESOLVE_INTERVAL = config("ALERT_RESOLVE_INTERVAL", default=5, cast=float) # Seconds between bulk resolutions of alerts of recovered devices
+ALERT_MIGRATE_INTERVAL = config("ALERT_MIGRATE_INTERVAL", default=3600, cast=float) # Seconds between checks for tenants with alerts in the legacy layout
+POWERLOST_THRESHOLD = 50 # 50W
+POWER_MIN_THRESHOLD = config("POWER_MIN_THRESHOLD", default=40, cast=float) # W, a device drawing less is considered off
+RULES_RELOAD_INTERVAL = config("RULES_RELOAD_INTERVAL", default=300, cast=float) # seconds, picks up alert rules edited outside the API
+RULES_RETRY_INTERVAL = config("RULES_RETRY_INTERVAL", default=5, cast=float) # seconds before retrying a failed rules load, doubled per failure up to RULES_RELOAD_INTERVAL
+COUNT_CACHE_TTL = config("COUNT_CACHE_TTL", default=60, cast=int) # seconds a paginated query total is cached
+
+# SCHEDULER
+SCHEDULER_ENABLED = config("SCHEDULER_ENABLED", default=True, cast=bool) # Take part in running periodic jobs, each runs once per interval across all replicas
+SCHEDULER_JITTER = config("SCHEDULER_JITTER", default=0.1, cast=float) # Fraction of the interval added at random to each attempt
+
+# DEVICE CACHE
+DEVICE_L1_SIZE = config("DEVICE_L1_SIZE", default=100000, cast=int) # In-process device metadata entries, 0 disables the L1 cache
+DEVICE_L1_TTL = config("DEVICE_L1_TTL", default=60.0, cast=float) # seconds, bounds staleness if an invalidation is missed
+DEVICE_CACHE_WARMUP = config("DEVICE_CACHE_WARMUP", default="incremental") # incremental | full (FLUSHDB and re-cache everything)
+DEVICE_SYNC_ENABLED = config("DEVICE_SYNC_ENABLED", default=False, cast=bool) # Tail the devices change stream (MongoDB replica set required)
+DEVICE_SYNC_BATCH = config("DEVICE_SYNC_BATCH", default=500, cast=int) # Change events applied per batch
+
+# SENSOR WRITE BUFFER
+SENSOR_BATCH_SIZE = config("SENSOR_BATCH_SIZE", default=500, cast=int) # Flush a tenant buffer at this many readings
+SENSOR_FLUSH_INTERVAL = config("SENSOR_FLUSH_INTERVAL", default=1.0, cast=float) # seconds
+SENSOR_DEDUP_SIZE = config("SENSOR_DEDUP_SIZE", default=100000, cast=int) # Recent (device_id, timestamp) keys kept for dedup
+
+# INGEST PIPELINE
+INGEST_WORKERS = config("INGEST_WORKERS", default=4, cast=int) # Worker threads, devices are pinned to one worker
+INGEST_QUEUE_SIZE = config("INGEST_QUEUE_SIZE", default=10000, cast=int) # Max queued messages per worker
+INGEST_OVERFLOW_POLICY = config("INGEST_OVERFLOW_POLICY", default="drop_oldest") # block | drop_newest | drop_oldest
+INGEST_PUT_TIMEOUT = config("INGEST_PUT_TIMEOUT", default=1.0, cast=float) # seconds to block before dropping (block policy)
+
+# SENSOR SPOOL
+SENSOR_BUFFER_LIMIT = config("SENSOR_BUFFER_LIMIT", default=50000, cast=int) # Pending readings before new batches go to the spool
+SPOOL_DIR = config("SPOOL_DIR", default="spool")
+SPOOL_SEGMENT_BYTES = config("SPOOL_SEGMENT_BYTES", default=64 * 1024 * 1024, cast=int) # Rotate segments at 64MB
+SPOOL_REPLAY_INTERVAL = config("SPOOL_REPLAY_INTERVAL", default=5.0, cast=float) # seconds
+SPOOL_REPLAY_BATCH = config("SPOOL_REPLAY_BATCH", default=1000, cast=int) # Readings per insert_many during replay
+
+# METRICS
+METRICS_ENABLED = config("METRICS_ENABLED", default=True, cast=bool) # Per-stage ingest timers
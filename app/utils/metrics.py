@@ -0,0 +1,170 @@
+"""
+Lightweight in-process metrics (counters, gauges and histograms) for hot paths.
+
+Histograms use fixed log-scale buckets, so observing a value is a bisect plus a few
+increments and percentiles can be estimated at any time without keeping samples.
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Any, Optional
+from utils.config import METRICS_ENABLED
+
+# Bucket upper bounds: 0.01 .. ~42000, doubling (milliseconds for timers)
+BUCKETS = [0.01 * 2 ** i for i in range(23)]
+
+class Counter:
+    """Monotonic counter, safe to increment from several threads"""
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+class Histogram:
+    """
+    Bucketed distribution of observed values: count, sum, min, max, last and percentiles.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.last = None
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(BUCKETS, value)
+        with self._lock:
+            self._buckets[index] += 1
+            self.count += 1
+            self.total += value
+            self.last = value
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Upper bound of the bucket holding the p-th percentile"""
+        if not self.count:
+            return None
+        rank = p / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self._buckets):
+            seen += count
+            if seen >= rank and count:
+                return min(BUCKETS[index], self.max) if index < len(BUCKETS) else self.max
+        return self.max
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "count": self.count,
+                "avg": self.total / self.count if self.count else 0.0,
+                "min": self.min,
+                "max": self.max,
+                "last": self.last,
+                "p50": self.percentile(50),
+                "p90": self.percentile(90),
+                "p99": self.percentile(99),
+            }
+
+class Timer:
+    """Context manager observing the elapsed milliseconds into one or more histograms"""
+    __slots__ = ("_histograms", "_start")
+
+    def __init__(self, *histograms: Histogram):
+        self._histograms = histograms
+
+    def __enter__(self):
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = (time.perf_counter_ns() - self._start) / 1e6
+        for histogram in self._histograms:
+            histogram.observe(elapsed)
+        return False
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_null_timer = _NullTimer()
+
+def labeled(name: str, **labels) -> str:
+    """Metric name with labels, e.g. `ingest.stage.decode{tenant=abc}`"""
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in sorted(labels.items())) + "}"
+
+class MetricsRegistry:
+    """Named collection of counters, gauges and histograms"""
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self._counters: Dict[str, Counter] = {}
+        self._histograms: Dict[str, Histogram] = {}
+        self._gauges: Dict[str, Callable[[], float]] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str) -> Counter:
+        with self._lock:
+            if name not in self._counters:
+                self._counters[name] = Counter()
+            return self._counters[name]
+
+    def histogram(self, name: str) -> Histogram:
+        histogram = self._histograms.get(name)
+        if histogram is not None:
+            return histogram
+        with self._lock:
+            if name not in self._histograms:
+                self._histograms[name] = Histogram()
+            return self._histograms[name]
+
+    def gauge(self, name: str, fn: Callable[[], float]) -> None:
+        """Register a callable that is sampled whenever a snapshot is taken"""
+        with self._lock:
+            self._gauges[name] = fn
+
+    def timer(self, name: str, tenant: str | None = None):
+        """
+        Time a block into `name`, and into `name{tenant=...}` when a tenant is given.
+        Returns a no-op context manager when metrics are disabled.
+        """
+        if not self.enabled:
+            return _null_timer
+        if tenant:
+            return Timer(self.histogram(name), self.histogram(labeled(name, tenant=tenant)))
+        return Timer(self.histogram(name))
+
+    def snapshot(self, prefix: str = "") -> Dict[str, Any]:
+        gauges = {}
+        for name, fn in list(self._gauges.items()):
+            if not name.startswith(prefix):
+                continue
+            try:
+                gauges[name] = fn()
+            except Exception:
+                gauges[name] = None
+        return {
+            "counters": {name: c.value for name, c in list(self._counters.items()) if name.startswith(prefix)},
+            "gauges": gauges,
+            "histograms": {name: h.snapshot() for name, h in list(self._histograms.items()) if name.startswith(prefix)},
+        }
+
+# Create a singleton instance
+metrics = MetricsRegistry()
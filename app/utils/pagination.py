@@ -0,0 +1,73 @@
+"""
+## Keyset Pagination
+Pages of timestamped documents, newest first, resumed from the last (timestamp, _id)
+of the previous page instead of skipping over it, so every page costs the same.
+
+The cursor handed to clients is an opaque url-safe token of that position. Totals are
+optional and cached in Redis per query for COUNT_CACHE_TTL, since counting a filter
+scans every matching document.
+"""
+import base64
+import hashlib
+from datetime import datetime
+from typing import List, Optional, Tuple
+from bson import ObjectId, json_util
+from bson.errors import InvalidId
+from pymongo.collection import Collection
+from database.redis import get_redis_connection
+from utils.config import COUNT_CACHE_TTL
+from utils.logging import logger
+
+Position = Tuple[datetime, ObjectId]
+
+SORT = [("timestamp", -1), ("_id", -1)]
+
+def encode_cursor(document: dict) -> str:
+    """Cursor resuming after the given raw document"""
+    token = f"{document['timestamp'].isoformat()}|{document['_id']}"
+    return base64.urlsafe_b64encode(token.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Position:
+    """Position of a cursor. Raises ValueError if it is malformed."""
+    try:
+        token = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, _id = token.split("|")
+        return datetime.fromisoformat(timestamp), ObjectId(_id)
+    except (ValueError, InvalidId, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def find_page(collection: Collection, query: dict, after: Optional[Position] = None, limit: int = 100) -> Tuple[List[dict], Optional[str]]:
+    """
+    Raw documents of the page after `after`, or of the first page, and the cursor of
+    the next page (None on the last page).
+    """
+    if after:
+        timestamp, _id = after
+        query = {"$and": [query, {"timestamp": {"$lte": timestamp}}, {"$or": [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$lt": _id}},
+        ]}]}
+    # One extra document tells whether there is a next page
+    documents = list(collection.find(query).sort(SORT).limit(limit + 1))
+    if len(documents) <= limit:
+        return documents, None
+    documents = documents[:limit]
+    return documents, encode_cursor(documents[-1])
+
+def cached_count(collection: Collection, query: dict) -> int:
+    """Number of documents matching `query`, at most COUNT_CACHE_TTL seconds old"""
+    digest = hashlib.sha1(json_util.dumps(query, sort_keys=True).encode()).hexdigest()
+    key = f"count:{collection.full_name}:{digest}"
+    redis = get_redis_connection()
+    try:
+        cached = redis.get(key)
+        if cached is not None:
+            return int(cached)
+    except Exception as e:
+        logger.error(f"Failed to read cached count: {e}")
+    count = collection.count_documents(query)
+    try:
+        redis.set(key, count, ex=COUNT_CACHE_TTL)
+    except Exception as e:
+        logger.error(f"Failed to cache count: {e}")
+    return count